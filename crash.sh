@@ -3,7 +3,16 @@
 
 usage() {
 cat <<END >&2
-usage: $(basename $0) [-d|--search-dir <debuginfo/module dir>] <vmlinux> <vmcore>
+usage: $(basename $0) [-d|--search-dir <debuginfo/module dir>] [--lazy-modules] [--lazy-tasks] [--profile <file>] <vmlinux> <vmcore>
+
+Options:
+--lazy-modules  Load the symbols for each module only when they are
+                first needed instead of at startup.
+--lazy-tasks    Only locate the tasks at startup and set up each task
+                the first time it is used.
+--profile <file>
+                Report the time, reads and Python allocations for each
+                phase of startup and save the profile to <file> as JSON.
 
 Debugging options:
 --gdb           Run the embedded gdb underneath a separate gdb instance.
@@ -18,7 +27,7 @@ END
 exit 1
 }
 
-TEMP=$(getopt -o 'd:h' --long 'search-dir:,gdb,valgrind,nofiles,help' -n "$(basename $0)" -- "$@")
+TEMP=$(getopt -o 'd:h' --long 'search-dir:,lazy-modules,lazy-tasks,profile:,gdb,valgrind,nofiles,help' -n "$(basename $0)" -- "$@")
 
 if [ $? -ne 0 ]; then
     echo "Terminating." >&2
@@ -35,6 +44,21 @@ while true; do
             shift 2
             continue
         ;;
+        '--lazy-modules')
+            LAZY_MODULES=True
+            shift
+            continue
+            ;;
+        '--lazy-tasks')
+            LAZY_TASKS=True
+            shift
+            continue
+            ;;
+        '--profile')
+            PROFILE="$2"
+            shift 2
+            continue
+            ;;
         '--gdb')
             DEBUGMODE=gdb
             shift
@@ -111,6 +135,8 @@ else
 fi
 
 VMCORE=$2
+LAZY_MODULES=${LAZY_MODULES:-False}
+LAZY_TASKS=${LAZY_TASKS:-False}
 cat << EOF >> $GDBINIT
 set build-id-verbose 0
 set python print-stack full
@@ -128,7 +154,11 @@ except RuntimeError as e:
     sys.exit(1)
 path = "$SEARCHDIRS".split(' ')
 try:
-   x = crash.session.Session("$KERNEL", "$VMCORE", "$ZKERNEL", path)
+   x = crash.session.Session("$KERNEL", "$VMCORE", "$ZKERNEL", path,
+                              lazy_modules=$LAZY_MODULES,
+                              lazy_tasks=$LAZY_TASKS,
+                              profile=bool("$PROFILE"),
+                              profile_output="$PROFILE" or None)
    print("The 'pyhelp' command will list the command extensions.")
 except gdb.error as e:
     print("crash-python: {}, exiting".format(str(e)), file=sys.stderr)
@@ -7,6 +7,7 @@ from __future__ import division
 
 import gdb
 import sys
+import struct
 
 if sys.version_info.major >= 3:
     long = int
@@ -14,14 +15,61 @@ if sys.version_info.major >= 3:
 import addrxlat
 from crash.infra import CrashBaseClass, export
 from crash.cache.syscache import utsname
-from crash.util import offsetof
+from crash.util import offsetof, TypesUtilClass
+from crash.kdump.pagecache import PageCache
+
+# Page-table pages are read whole and kept around for later lookups
+PGT_CACHE_SIZE = 64 << 12
 
 class TranslationContext(addrxlat.Context):
+    """
+    An addrxlat context that reads page table entries through gdb
+
+    This is only used for targets without a dump file; libkdumpfile's
+    own context reads page tables from the dump directly.  Page table
+    entries are read as raw memory a page at a time and the pages are
+    cached, so walking the tables doesn't need a gdb.Value for every
+    entry.
+
+    Args:
+        page_size (int, optional, default=4096): The size of a page
+    """
     def __init__(self, *args, **kwargs):
+        page_size = kwargs.pop('page_size', 4096)
         super(TranslationContext, self).__init__(*args, **kwargs)
         self.read_caps = addrxlat.CAPS(addrxlat.KVADDR)
-        self.uint32_ptr = gdb.lookup_type('uint32_t').pointer()
-        self.uint64_ptr = gdb.lookup_type('uint64_t').pointer()
+
+        order = TypesUtilClass.target_byte_order()
+        self.u32 = struct.Struct(order + 'I')
+        self.u64 = struct.Struct(order + 'Q')
+
+        self.page_size = page_size
+        self.pgt_caches = {}
+
+    def reset_stats(self):
+        for cache in self.pgt_caches.values():
+            cache.reset_stats()
+
+    def pgt_cache(self, addrspace):
+        try:
+            return self.pgt_caches[addrspace]
+        except KeyError:
+            pass
+
+        def reader(addr, length):
+            buf = gdb.selected_inferior().read_memory(addr, length)
+            return bytes(buf)
+
+        cache = PageCache(reader, self.page_size, PGT_CACHE_SIZE)
+        self.pgt_caches[addrspace] = cache
+        return cache
+
+    def read_entry(self, faddr, fmt):
+        try:
+            buf = self.pgt_cache(faddr.addrspace).read(faddr.addr, fmt.size)
+        except gdb.MemoryError:
+            raise addrxlat.NoDataError()
+        return fmt.unpack_from(buf)[0]
 
     def cb_sym(self, symtype, *args):
         if symtype == addrxlat.SYM_VALUE:
@@ -43,18 +91,152 @@ class TranslationContext(addrxlat.Context):
         return super(TranslationContext, self).cb_sym(symtype, *args)
 
     def cb_read32(self, faddr):
-        return long(gdb.Value(faddr.addr).cast(self.uint32_ptr).dereference())
+        return self.read_entry(faddr, self.u32)
 
     def cb_read64(self, faddr):
-        return long(gdb.Value(faddr.addr).cast(self.uint64_ptr).dereference())
+        return self.read_entry(faddr, self.u64)
+
+# The translation cache is dropped when it grows beyond this many entries
+TLB_MAX_ENTRIES = 1 << 18
+
+class TranslationCache(object):
+    """
+    A software TLB for kernel virtual to physical address translations
+
+    Translations are cached per virtual page.  When the page tables map
+    an address with a huge page, the whole huge page is cached as a single
+    entry keyed by the huge page size.
+
+    Args:
+        context (addrxlat.Context): The translation context
+        system (addrxlat.System): The translation system
+        page_shift (int, optional, default=12): The base page shift
+    """
+    def __init__(self, context, system, page_shift=12):
+        self.context = context
+        self.system = system
+        self.page_shift = page_shift
+        self.flush()
+        self.reset_stats()
+
+    def flush(self):
+        # (addrspace, shift) -> { virtual page number : physical base }
+        self.entries = {}
+        self.shifts = [ self.page_shift ]
+        self.count = 0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        sizes = {}
+        for (space, shift), entries in self.entries.items():
+            sizes[1 << shift] = sizes.get(1 << shift, 0) + len(entries)
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'entries' : self.count,
+            'entries_by_size' : sizes,
+        }
+
+    def lookup(self, addr, addrspace):
+        for shift in self.shifts:
+            try:
+                base = self.entries[(addrspace, shift)][addr >> shift]
+            except KeyError:
+                continue
+            return base | (addr & ((1 << shift) - 1))
+        return None
+
+    def insert(self, addr, addrspace, paddr, shift):
+        if self.count >= TLB_MAX_ENTRIES:
+            self.flush()
+        if shift not in self.shifts:
+            self.shifts.append(shift)
+            self.shifts.sort(reverse=True)
+        key = (addrspace, shift)
+        if key not in self.entries:
+            self.entries[key] = {}
+        self.entries[key][addr >> shift] = paddr & ~((1 << shift) - 1)
+        self.count += 1
+
+    def page_shift_for_level(self, meth, level):
+        # Without the field layout we can only cache base pages
+        fields = getattr(meth, 'fields', None)
+        if level is None or not fields or level > len(fields):
+            return self.page_shift
+        return sum(fields[:level])
+
+    def walk(self, addr, addrspace):
+        meth = self.system.get_map(addrxlat.SYS_MAP_HW).search(addr)
+        if meth == addrxlat.SYS_METH_NONE:
+            meth = self.system.get_map(addrxlat.SYS_MAP_KV_PHYS).search(addr)
+        if meth == addrxlat.SYS_METH_NONE:
+            fulladdr = addrxlat.FullAddress(addrxlat.KVADDR, addr)
+            fulladdr.conv(addrspace, self.context, self.system)
+            return (fulladdr.addr, self.page_shift)
+
+        step = addrxlat.Step(self.context, self.system)
+        meth = self.system.get_meth(meth)
+        step.meth = meth
+        step.launch(addr)
+
+        # A huge page terminates the walk early, so the level of the
+        # last table entry read tells us the size of the mapping.
+        level = None
+        while step.remain > 1:
+            level = step.remain - 1
+            step.step()
+        step.step()
+
+        shift = self.page_shift_for_level(meth, level)
+        fulladdr = step.base.copy()
+        if fulladdr.addrspace != addrspace:
+            # The conversion is only known to be linear within a page
+            fulladdr.conv(addrspace, self.context, self.system)
+            shift = self.page_shift
+        return (fulladdr.addr, shift)
+
+    def translate(self, addr, addrspace=addrxlat.KPHYSADDR):
+        """
+        Translates a kernel virtual address
+
+        Args:
+            addr (long): The kernel virtual address to translate
+            addrspace (int, optional, default=addrxlat.KPHYSADDR): The
+                address space to translate to
+
+        Returns:
+            long: The translated address
+
+        Raises:
+            addrxlat.BaseException: The address could not be translated
+        """
+        paddr = self.lookup(addr, addrspace)
+        if paddr is not None:
+            self.hits += 1
+            return paddr
+
+        self.misses += 1
+        try:
+            paddr, shift = self.walk(addr, addrspace)
+        except addrxlat.BaseException:
+            self.context.clear_err()
+            raise
+        self.insert(addr, addrspace, paddr, shift)
+        return paddr
 
 class CrashAddressTranslation(CrashBaseClass):
     def __init__(self):
+        self.tlb = None
+        target = gdb.current_target()
         try:
-            target = gdb.current_target()
             self.context = target.kdump.get_addrxlat_ctx()
             self.system = target.kdump.get_addrxlat_sys()
+            self.tlb = getattr(target, 'tlb', None)
         except AttributeError:
+            # Targets without a dump file read page tables through gdb
             self.context = TranslationContext()
             self.system = addrxlat.System()
             self.system.os_init(self.context,
@@ -71,6 +253,9 @@ class CrashAddressTranslation(CrashBaseClass):
                 self.is_non_auto = True
                 break
 
+        if self.tlb is None:
+            self.tlb = TranslationCache(self.context, self.system)
+
     @export
     def addrxlat_context(self):
         return self.context
@@ -82,3 +267,11 @@ class CrashAddressTranslation(CrashBaseClass):
     @export
     def addrxlat_is_non_auto(self):
         return self.is_non_auto
+
+    @export
+    def addrxlat_tlb(self):
+        return self.tlb
+
+    @export
+    def addrxlat_translate(self, addr, addrspace=addrxlat.KPHYSADDR):
+        return self.tlb.translate(addr, addrspace)
@@ -6,6 +6,7 @@ from __future__ import print_function
 from __future__ import division
 
 import gdb
+from gdb.unwinder import Unwinder, register_unwinder
 
 class CrashArchitecture(object):
     ident = "base-class"
@@ -22,39 +23,32 @@ class CrashArchitecture(object):
     def setup_thread_info(self, thread):
         raise NotImplementedError("setup_thread_info not implemented")
 
+    def unwind_frame(self, pending_frame):
+        return None
+
     def fetch_register(self, thread, register):
         if thread.info.active:
             self.fetch_register_active(thread, register)
         else:
             self.fetch_register_scheduled(thread, register)
 
-# This keeps stack traces from continuing into userspace and causing problems.
-class KernelFrameFilter(object):
-    def __init__(self, address):
-        self.name = "KernelFrameFilter"
-        self.priority = 100
-        self.enabled = True
-        self.address = address
-        gdb.frame_filters[self.name] = self
-
-    def filter(self, frame_iter):
-        return KernelAddressIterator(frame_iter, self.address)
-
-class KernelAddressIterator(object):
-    def __init__(self, ii, address):
-        self.input_iterator = ii
-        self.address = address
-
-    def __iter__(self):
-        return self
-
-    def next(self):
-        frame = next(self.input_iterator)
-
-        if frame.inferior_frame().pc() < self.address:
-            raise StopIteration
-
-        return frame
+class FrameId(object):
+    def __init__(self, sp, pc):
+        self.sp = sp
+        self.pc = pc
+
+# This keeps stack traces from continuing into userspace and lets them
+# continue past the points where the kernel was entered, e.g. from an
+# IRQ or exception stack back to the task stack.  Frames that aren't
+# at one of those points are left to gdb's own unwinders.
+class KernelUnwinder(Unwinder):
+    def __init__(self, arch):
+        super(KernelUnwinder, self).__init__("KernelUnwinder")
+        self.arch = arch
+        register_unwinder(None, self, replace=True)
+
+    def __call__(self, pending_frame):
+        return self.arch.unwind_frame(pending_frame)
 
 architectures = {}
 def register(arch):
@@ -7,11 +7,14 @@ from __future__ import division
 
 import gdb
 import sys
+import struct
 
 if sys.version_info.major >= 3:
     long = int
 
-from crash.arch import CrashArchitecture, register, KernelFrameFilter
+from crash.arch import CrashArchitecture, register, KernelUnwinder, FrameId
+from crash.util import offsetof
+from crash.types.stack import TypesStackClass
 
 class x86_64Architecture(CrashArchitecture):
     ident = "i386:x86-64"
@@ -19,18 +22,28 @@ class x86_64Architecture(CrashArchitecture):
 
     def __init__(self):
         super(x86_64Architecture, self).__init__()
+        # The registers of blocked threads, keyed by task_struct address.
+        # They can't change, so each thread's saved frame is decoded once.
+        self.scheduled_regs = {}
+        self.ulong = struct.Struct('<Q')
+        self.sp_offset = offsetof('struct task_struct', 'thread.sp')
+
         # PC for blocked threads
         try:
             inactive = gdb.lookup_type('struct inactive_task_frame')
-            self.fetch_register_scheduled = \
-                self.fetch_register_scheduled_inactive
+            self.decode_scheduled_regs = self.decode_inactive_task_frame
             self.inactive_task_frame_type = inactive
+            self.inactive_task_frame_fields = []
+            for name, reg in [ ('ret_addr', 'rip'), ('bp', 'rbp'),
+                               ('bx', 'rbx'), ('r12', 'r12'), ('r13', 'r13'),
+                               ('r14', 'r14'), ('r15', 'r15') ]:
+                self.inactive_task_frame_fields.append(
+                                    (reg, offsetof(inactive, name)))
         except gdb.error as e:
             try:
                 thread_return = gdb.lookup_minimal_symbol("thread_return")
-                self.thread_return = thread_return.value().address
-                self.fetch_register_scheduled = \
-                    self.fetch_register_scheduled_thread_return
+                self.thread_return = long(thread_return.value().address)
+                self.decode_scheduled_regs = self.decode_thread_return
             except Exception:
                 raise RuntimeError("{} requires symbol 'thread_return'"
                                    .format(self.__class__.__name__))
@@ -39,7 +52,190 @@ class x86_64Architecture(CrashArchitecture):
         self.thread_info_p_type = thread_info_type.pointer()
 
         # Stop stack traces with addresses below this
-        self.filter = KernelFrameFilter(0xffff000000000000)
+        self.user_limit = long(0xffff000000000000)
+        self.entry_text = self.symbol_range('__entry_text_start',
+                                            '__entry_text_end')
+        # Kernels built with the ORC unwinder use rbp as a general
+        # register, so it can only be followed as a frame pointer in
+        # kernels without it.
+        self.frame_pointers = \
+            gdb.lookup_minimal_symbol('__start_orc_unwind_ip') is None
+        self.setup_pt_regs()
+        self.unwinder = KernelUnwinder(self)
+
+    @staticmethod
+    def symbol_range(start, end):
+        start = gdb.lookup_minimal_symbol(start)
+        end = gdb.lookup_minimal_symbol(end)
+        if start is None or end is None:
+            return None
+        return (long(start.value().address), long(end.value().address))
+
+    def setup_pt_regs(self):
+        pt_regs = gdb.lookup_type('struct pt_regs')
+        self.pt_regs_size = pt_regs.sizeof
+        self.pt_regs_fields = []
+        for field in pt_regs.fields():
+            name = field.name
+            # Newer kernels wrap cs and ss in anonymous unions
+            if name is None:
+                for member in field.type.fields():
+                    if member.name in self.pt_regs_registers:
+                        name = member.name
+                        break
+            if name in self.pt_regs_registers:
+                self.pt_regs_fields.append((self.pt_regs_registers[name],
+                                            field.bitpos // 8))
+
+    # The gdb register for each pt_regs member
+    pt_regs_registers = {
+        'r15' : 'r15', 'r14' : 'r14', 'r13' : 'r13', 'r12' : 'r12',
+        'bp' : 'rbp', 'bx' : 'rbx', 'r11' : 'r11', 'r10' : 'r10',
+        'r9' : 'r9', 'r8' : 'r8', 'ax' : 'rax', 'cx' : 'rcx',
+        'dx' : 'rdx', 'si' : 'rsi', 'di' : 'rdi', 'ip' : 'rip',
+        'cs' : 'cs', 'flags' : 'eflags', 'sp' : 'rsp', 'ss' : 'ss',
+    }
+
+    # __KERNEL_CS, __USER_CS and __USER32_CS
+    kernel_cs = 0x10
+    valid_cs = [ 0x10, 0x33, 0x23 ]
+
+    def read_pt_regs(self, address):
+        """
+        Reads the pt_regs at an address if it looks like one
+
+        Returns:
+            dict: The registers in the pt_regs, keyed by gdb register
+                name, or None if it can't be read or isn't valid
+        """
+        try:
+            buf = gdb.selected_inferior().read_memory(address,
+                                                      self.pt_regs_size)
+        except gdb.MemoryError:
+            return None
+
+        regs = {}
+        for name, offset in self.pt_regs_fields:
+            regs[name] = self.ulong.unpack_from(buf, offset)[0]
+
+        # Bit 1 of eflags is always set
+        if (regs.get('cs', 0) & 0xffff) not in self.valid_cs or \
+           not regs.get('eflags', 0) & 0x2:
+            return None
+        return regs
+
+    def task_stack_range(self):
+        """
+        Returns the bounds of the kernel stack of the selected task, or
+        None if it isn't known
+        """
+        thread = gdb.selected_thread()
+        task = getattr(thread, 'info', None) if thread is not None else None
+        if task is None:
+            return None
+        base = long(task.task_struct['stack'])
+        return (base, base + TypesStackClass.thread_size())
+
+    def read_irq_pt_regs(self, sp):
+        """
+        Reads the pt_regs of an interrupt that switched to the IRQ stack
+
+        When the entry code switches to the IRQ stack, it saves the
+        stack pointer of the interrupted context, which points to its
+        pt_regs, in the word at the top of the IRQ stack before calling
+        into C.  So the word at the stack pointer of the entry frame is
+        only followed if the pt_regs it points to lie entirely on the
+        task's own stack.
+
+        Returns:
+            dict: The registers in the pt_regs, or None if they can't be
+                found
+        """
+        bounds = self.task_stack_range()
+        if bounds is None:
+            return None
+        try:
+            address = self.read_ulong(sp)
+        except gdb.MemoryError:
+            return None
+        if not bounds[0] <= address <= bounds[1] - self.pt_regs_size:
+            return None
+        return self.read_pt_regs(address)
+
+    def caller_is_user(self, sp, rbp):
+        """
+        Returns whether the frame pointer chain shows that a frame
+        returns to a user mode or zero pc
+
+        The frame pointer is only followed when it lies on the task's
+        stack above the stack pointer; anything else can't be trusted.
+        """
+        if not self.frame_pointers:
+            return False
+        bounds = self.task_stack_range()
+        if bounds is None or \
+           not max(sp, bounds[0]) <= rbp <= bounds[1] - 2 * self.ulong.size:
+            return False
+        try:
+            return self.read_ulong(rbp + self.ulong.size) < self.user_limit
+        except gdb.MemoryError:
+            return False
+
+    def unwind_frame(self, pending_frame):
+        """
+        Unwinds a kernel frame whose caller gdb can't find by itself or
+        must not show
+
+        Entry code frames are unwound through the pt_regs the kernel
+        saved there.  Whenever the caller of a frame would be in user
+        mode or have a zero pc, the frame is claimed without a saved pc
+        so that gdb ends the backtrace with it and never creates the
+        caller.  Other frames are left to gdb's own unwinders.
+
+        Returns:
+            gdb.UnwindInfo: The unwind info for the frame, or None to
+                let gdb unwind it
+        """
+        pc = pending_frame.read_register('rip')
+        sp = pending_frame.read_register('rsp')
+        address = long(pc)
+
+        if address < self.user_limit:
+            # Only an active task interrupted in user mode starts here
+            return self.last_frame(pending_frame, sp, pc)
+
+        if self.entry_text is None or \
+           not self.entry_text[0] <= address < self.entry_text[1]:
+            rbp = long(pending_frame.read_register('rbp'))
+            if self.caller_is_user(long(sp), rbp):
+                return self.last_frame(pending_frame, sp, pc)
+            return None
+
+        # The entry code calls into C with the pt_regs at the top of the
+        # stack, or on the task stack if it switched to the IRQ stack
+        # first.  If neither is found, it came from user mode or the
+        # stack can't be followed, so it is the last frame either way.
+        regs = self.read_pt_regs(long(sp))
+        if regs is None:
+            regs = self.read_irq_pt_regs(long(sp))
+        if regs is None or (regs['cs'] & 0xffff) != self.kernel_cs or \
+           regs.get('rip', 0) < self.user_limit:
+            return self.last_frame(pending_frame, sp, pc)
+
+        info = pending_frame.create_unwind_info(FrameId(sp, pc))
+        for name, value in regs.items():
+            if name in [ 'cs', 'ss', 'eflags' ]:
+                continue
+            value = gdb.Value(value).cast(self.ulong_type)
+            if name in [ 'rip', 'rsp' ]:
+                value = value.cast(pending_frame.read_register(name).type)
+            info.add_saved_register(name, value)
+        return info
+
+    @staticmethod
+    def last_frame(pending_frame, sp, pc):
+        # Without a saved pc, gdb ends the backtrace at this frame
+        return pending_frame.create_unwind_info(FrameId(sp, pc))
 
     def setup_thread_info(self, thread):
         task = thread.info.task_struct
@@ -56,50 +252,30 @@ class x86_64Architecture(CrashArchitecture):
             except KeyError as e:
                 pass
 
-    def fetch_register_scheduled_inactive(self, thread, register):
-        ulong_type = self.ulong_type
-        task = thread.info.task_struct
+    def read_ulong(self, address):
+        buf = gdb.selected_inferior().read_memory(address, self.ulong.size)
+        return self.ulong.unpack_from(buf)[0]
 
-        rsp = task['thread']['sp'].cast(ulong_type.pointer())
+    def decode_inactive_task_frame(self, task):
+        rsp = self.read_ulong(task.address + self.sp_offset)
 
-        frame = rsp.cast(self.inactive_task_frame_type.pointer()).dereference()
+        # The whole frame is read at once rather than member by member
+        size = self.inactive_task_frame_type.sizeof
+        frame = gdb.selected_inferior().read_memory(rsp, size)
 
-        # Only write rip when requested; It resets the frame cache
-        if register == 16 or register == -1:
-            thread.registers['rip'].value = frame['ret_addr']
-            if register == 16:
-                return True
+        regs = { 'rsp' : rsp }
+        for reg, offset in self.inactive_task_frame_fields:
+            regs[reg] = self.ulong.unpack_from(frame, offset)[0]
+        return regs
 
-        thread.registers['rsp'].value = rsp
-        thread.registers['rbp'].value = frame['bp']
-        thread.registers['rbx'].value = frame['bx']
-        thread.registers['r12'].value = frame['r12']
-        thread.registers['r13'].value = frame['r13']
-        thread.registers['r14'].value = frame['r14']
-        thread.registers['r15'].value = frame['r15']
-        thread.registers['cs'].value = 2*8
-        thread.registers['ss'].value = 3*8
-
-        thread.info.stack_pointer = rsp
-        thread.info.valid_stack = True
+    def decode_thread_return(self, task):
+        rsp = self.read_ulong(task.address + self.sp_offset)
+        rbp = self.read_ulong(rsp)
 
-    def fetch_register_scheduled_thread_return(self, thread, register):
-        ulong_type = self.ulong_type
-        task = thread.info.task_struct
-
-        # Only write rip when requested; It resets the frame cache
-        if register == 16 or register == -1:
-            thread.registers['rip'].value = self.thread_return
-            if register == 16:
-                return True
-
-        rsp = task['thread']['sp'].cast(ulong_type.pointer())
-        rbp = rsp.dereference().cast(ulong_type.pointer())
-        rbx = (rbp - 1).dereference()
-        r12 = (rbp - 2).dereference()
-        r13 = (rbp - 3).dereference()
-        r14 = (rbp - 4).dereference()
-        r15 = (rbp - 5).dereference()
+        # rbx, r12, r13, r14 and r15 were pushed below the frame pointer
+        size = self.ulong.size
+        saved = gdb.selected_inferior().read_memory(rbp - 5 * size, 5 * size)
+        r15, r14, r13, r12, rbx = struct.unpack_from('<5Q', saved)
 
         # The two pushes that don't have CFI info
         # rsp += 2
@@ -108,18 +284,31 @@ class x86_64Architecture(CrashArchitecture):
         # if ex:
         #     print("EXCEPTION STACK: pid {:d}".format(task['pid']))
 
-        thread.registers['rsp'].value = rsp
-        thread.registers['rbp'].value = rbp
-        thread.registers['rbx'].value = rbx
-        thread.registers['r12'].value = r12
-        thread.registers['r13'].value = r13
-        thread.registers['r14'].value = r14
-        thread.registers['r15'].value = r15
+        return { 'rip' : self.thread_return, 'rsp' : rsp, 'rbp' : rbp,
+                 'rbx' : rbx, 'r12' : r12, 'r13' : r13, 'r14' : r14,
+                 'r15' : r15 }
+
+    def fetch_register_scheduled(self, thread, register):
+        task = thread.info
+        try:
+            regs = self.scheduled_regs[task.address]
+        except KeyError:
+            regs = self.decode_scheduled_regs(task)
+            self.scheduled_regs[task.address] = regs
+
+        # Only write rip when requested; It resets the frame cache
+        if register == 16 or register == -1:
+            thread.registers['rip'].value = regs['rip']
+            if register == 16:
+                return True
+
+        for reg in ['rsp', 'rbp', 'rbx', 'r12', 'r13', 'r14', 'r15']:
+            thread.registers[reg].value = regs[reg]
         thread.registers['cs'].value = 2*8
         thread.registers['ss'].value = 3*8
 
-        thread.info.stack_pointer = rsp
-        thread.info.valid_stack = True
+        task.stack_pointer = regs['rsp']
+        task.valid_stack = True
 
     @classmethod
     def get_stack_pointer(cls, thread):
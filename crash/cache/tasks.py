@@ -6,15 +6,276 @@ from __future__ import print_function
 from __future__ import division
 
 import gdb
+import re
+from array import array
 from crash.cache import CrashCache
 
+class TaskTable(object):
+    """
+    A column-oriented table of the basic attributes of every task
+
+    Each attribute is kept in a typed array with one row per task, so a
+    task costs a few dozen bytes instead of a LinuxTask, a gdb.Value
+    and a gdb thread.  The columns can be used directly for queries
+    over all tasks, e.g. with numpy.frombuffer.
+
+    Memory usage is unknown (-1) until it is recorded with
+    set_mem_usage.  Command names are interned: each distinct name is
+    stored once in names and the comm column refers to it by number.
+
+    Indexes by address, thread group, name, parent, state and cpu are
+    built on first use and rebuilt after tasks are added or removed.
+
+    Attributes:
+        pid (array of int): The pid of each task
+        tgid (array of int): The thread group id of each task
+        address (array of long): The address of each task_struct
+        cpu (array of int): The cpu each task last ran on, or -1
+        state (array of long): The state (and exit_state) of each task
+        rss (array of long): The resident set size in pages, or -1
+        total_vm (array of long): The virtual memory size in pages, or -1
+        parent (array of long): The address of each task's parent, or 0
+        comm (array of int): The number of each task's name in names
+        names (list of str): The distinct command names
+    """
+    columns = [ ('pid', 'i'), ('tgid', 'i'), ('address', 'L'), ('cpu', 'i'),
+                ('state', 'L'), ('rss', 'l'), ('total_vm', 'l'),
+                ('parent', 'L'), ('comm', 'i') ]
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        for name, typecode in self.columns:
+            setattr(self, name, array(typecode))
+        self.rows = {}
+        self.names = []
+        self.name_ids = {}
+        self.indexed = False
+
+    def intern_name(self, name):
+        try:
+            return self.name_ids[name]
+        except KeyError:
+            pass
+        name_id = len(self.names)
+        self.names.append(name)
+        self.name_ids[name] = name_id
+        return name_id
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, pid):
+        return pid in self.rows
+
+    def add(self, pid, tgid, address, cpu=-1, state=0, parent=0, comm=''):
+        """
+        Adds a task to the table
+
+        Returns:
+            int: The row for the task
+        """
+        self.indexed = False
+        name_id = self.intern_name(comm)
+        row = self.rows.get(pid)
+        if row is not None:
+            self.tgid[row] = tgid
+            self.address[row] = address
+            self.cpu[row] = cpu
+            self.state[row] = state
+            self.parent[row] = parent
+            self.comm[row] = name_id
+            return row
+
+        row = len(self.pid)
+        self.pid.append(pid)
+        self.tgid.append(tgid)
+        self.address.append(address)
+        self.cpu.append(cpu)
+        self.state.append(state)
+        self.rss.append(-1)
+        self.total_vm.append(-1)
+        self.parent.append(parent)
+        self.comm.append(name_id)
+        self.rows[pid] = row
+        return row
+
+    def row(self, pid):
+        """
+        Returns the row for a pid
+
+        Raises:
+            KeyError: The pid is not in the table
+        """
+        return self.rows[pid]
+
+    def remove(self, pid):
+        # The row is left in place so the other rows don't move
+        del self.rows[pid]
+        self.indexed = False
+
+    def set_mem_usage(self, pid, rss, total_vm):
+        row = self.rows[pid]
+        self.rss[row] = rss
+        self.total_vm[row] = total_vm
+
+    def pids(self):
+        """Returns the pids in the table, in pid order"""
+        return sorted(self.rows)
+
+    def build_indexes(self):
+        """Builds all of the indexes with one pass over the table"""
+        if self.indexed:
+            return
+
+        self.by_address = {}
+        self.by_tgid = {}
+        self.by_name = {}
+        self.by_state = {}
+        self.by_cpu = {}
+        for pid in sorted(self.rows):
+            row = self.rows[pid]
+            self.by_address[self.address[row]] = pid
+            self.by_tgid.setdefault(self.tgid[row], []).append(pid)
+            self.by_name.setdefault(self.comm[row], []).append(pid)
+            self.by_state.setdefault(self.state[row], []).append(pid)
+            self.by_cpu.setdefault(self.cpu[row], []).append(pid)
+
+        # Parents are recorded by address, so this needs by_address
+        self.by_parent = {}
+        for pid in sorted(self.rows):
+            ppid = self.by_address.get(self.parent[self.rows[pid]])
+            if ppid is not None and ppid != pid:
+                self.by_parent.setdefault(ppid, []).append(pid)
+
+        self.indexed = True
+
+    def pid_for_address(self, address):
+        """
+        Returns the pid of the task with a task_struct address
+
+        Raises:
+            KeyError: No task has that address
+        """
+        self.build_indexes()
+        return self.by_address[address]
+
+    def comm_for_pid(self, pid):
+        return self.names[self.comm[self.rows[pid]]]
+
+    def thread_group(self, tgid):
+        """Returns the pids of the threads in a thread group"""
+        self.build_indexes()
+        return list(self.by_tgid.get(tgid, []))
+
+    def parent_pid(self, pid):
+        """
+        Returns the pid of a task's parent, or None if it isn't known
+        """
+        self.build_indexes()
+        return self.by_address.get(self.parent[self.rows[pid]])
+
+    def children(self, pid):
+        """Returns the pids of a task's children"""
+        self.build_indexes()
+        return list(self.by_parent.get(pid, []))
+
+    def pids_for_comm(self, name):
+        """Returns the pids of the tasks with a command name"""
+        self.build_indexes()
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            return []
+        return list(self.by_name.get(name_id, []))
+
+    def pids_matching_comm(self, pattern):
+        """
+        Returns the pids of the tasks whose command name matches a
+        regular expression
+
+        Only the distinct names are matched, not every task.
+
+        Args:
+            pattern (str or compiled regex): The expression to search for
+        """
+        self.build_indexes()
+        if not hasattr(pattern, 'search'):
+            pattern = re.compile(pattern)
+        pids = []
+        for name_id, name in enumerate(self.names):
+            if pattern.search(name):
+                pids += self.by_name.get(name_id, [])
+        return sorted(pids)
+
+    def pids_in_state(self, mask):
+        """Returns the pids of the tasks with any of the state bits set"""
+        self.build_indexes()
+        pids = []
+        for state, members in self.by_state.items():
+            if state & mask or (mask == 0 and state == 0):
+                pids += members
+        return sorted(pids)
+
+    def pids_on_cpu(self, cpu):
+        """Returns the pids of the tasks that last ran on a cpu"""
+        self.build_indexes()
+        return list(self.by_cpu.get(cpu, []))
+
+task_table = TaskTable()
+
 tasks = {}
 
+# The memory usage of each mm_struct, keyed by address, as a tuple of
+# (rss, total_vm, pgd).  The threads of a process share one mm_struct,
+# so this is filled in once per process rather than once per thread.
+mm_usage = {}
+
+# Called as loader(address) to set up a task that is in the table but
+# hasn't been set up yet.  It must return the LinuxTask after caching it.
+task_loader = None
+
 def cache_task(task):
-    tasks[int(task.task_struct['pid'])] = task
+    tasks[task.pid] = task
+
+def set_task_loader(loader):
+    global task_loader
+    task_loader = loader
 
 def get_task(pid):
-    return tasks[pid]
+    try:
+        return tasks[pid]
+    except KeyError:
+        if task_loader is None:
+            raise
+    row = task_table.row(pid)
+    return task_loader(task_table.address[row])
+
+def get_task_by_address(address):
+    """
+    Returns the task with a task_struct address
+
+    Raises:
+        KeyError: No task has that address
+    """
+    return get_task(task_table.pid_for_address(address))
+
+def task_pids():
+    """Returns the pids of all known tasks, whether set up or not"""
+    return sorted(set(tasks) | set(task_table.rows))
+
+def for_each_task():
+    """
+    Iterates over all tasks in pid order, setting up deferred tasks as
+    they are reached
+    """
+    for pid in task_pids():
+        try:
+            yield get_task(pid)
+        except KeyError:
+            continue
 
 def drop_task(pid):
-    del tasks[pid]
+    if pid in task_table:
+        task_table.remove(pid)
+    tasks.pop(pid, None)
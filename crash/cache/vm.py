@@ -6,13 +6,141 @@ from __future__ import print_function
 from __future__ import division
 
 import gdb
+import sys
+
+if sys.version_info.major >= 3:
+    long = int
 
 from crash.cache import CrashCache
+from crash.util import array_size
+
 class CrashCacheVM(CrashCache):
+    """
+    A summary of the memory in the system
+
+    The figures are computed the first time they are used and kept for
+    the rest of the session, so commands that show memory as a share
+    of the total don't need to walk the zones again.
+
+    Attributes:
+        page_size (int): The size of a page in bytes
+        totalram_pages (long): The number of pages managed by the page
+            allocator, as in the MemTotal line of /proc/meminfo, or 0 if
+            it couldn't be determined
+    """
     def __init__(self):
         super(CrashCacheVM, self).__init__()
 
     def refresh(self):
-        pass
+        try:
+            del self.totalram_pages
+        except AttributeError:
+            pass
+
+    @staticmethod
+    def counter_value(value):
+        # Since Linux 5.0, most of the page counts are atomic_long_t
+        if value.type.strip_typedefs().code == gdb.TYPE_CODE_STRUCT:
+            value = value['counter']
+        return long(value)
+
+    @staticmethod
+    def lookup_variable(name):
+        sym = gdb.lookup_global_symbol(name)
+        if sym is None:
+            sym = gdb.lookup_symbol(name, None)[0]
+        if sym is None or sym.type.code == gdb.TYPE_CODE_FUNC:
+            return None
+        return sym.value()
+
+    def nodes(self):
+        contig = self.lookup_variable('contig_page_data')
+        if contig is not None:
+            return [ contig ]
+
+        node_data = self.lookup_variable('node_data')
+        if node_data is None:
+            return []
+
+        nodes = []
+        for nid in range(0, array_size(node_data)):
+            pgdat = node_data[nid]
+            if pgdat:
+                nodes.append(pgdat.dereference())
+        return nodes
+
+    def zone_pages(self):
+        """
+        Returns the number of pages in all of the zones
+
+        managed_pages is used where the kernel has it; older kernels
+        only have present_pages.
+        """
+        pages = 0
+        for pgdat in self.nodes():
+            zones = pgdat['node_zones']
+            for index in range(0, int(pgdat['nr_zones'])):
+                zone = zones[index]
+                try:
+                    count = zone['managed_pages']
+                except gdb.error:
+                    count = zone['present_pages']
+                pages += self.counter_value(count)
+        return pages
+
+    def memblock_pages(self):
+        memblock = self.lookup_variable('memblock')
+        if memblock is None:
+            return 0
+        return long(memblock['memory']['total_size']) // self.page_size
+
+    def load_page_size(self):
+        """
+        Determines the page size from the dump file, falling back to
+        PAGE_SHIFT if the kernel was built with macro debuginfo
+        """
+        page_size = None
+        kdump = getattr(gdb.current_target(), 'kdump', None)
+        if kdump is not None:
+            page_size = kdump.attr.get('arch.page_size')
+
+        if page_size is None:
+            try:
+                page_size = 1 << int(gdb.parse_and_eval('PAGE_SHIFT'))
+            except gdb.error:
+                page_size = 4096
+
+        self.page_size = long(page_size)
+        return self.page_size
+
+    def load_totalram_pages(self):
+        pages = 0
+        for name in ['_totalram_pages', 'totalram_pages']:
+            value = self.lookup_variable(name)
+            if value is not None:
+                pages = self.counter_value(value)
+                break
+
+        if not pages:
+            try:
+                pages = self.zone_pages()
+            except gdb.error:
+                pages = 0
+
+        if not pages:
+            try:
+                pages = self.memblock_pages()
+            except gdb.error:
+                pages = 0
+
+        self.totalram_pages = pages
+        return self.totalram_pages
+
+    def __getattr__(self, name):
+        if name == 'totalram_pages':
+            return self.load_totalram_pages()
+        if name == 'page_size':
+            return self.load_page_size()
+        return getattr(self.__class__, name)
 
 cache = CrashCacheVM()
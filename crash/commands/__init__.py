@@ -44,12 +44,19 @@ class CrashCommand(CrashBaseClass, gdb.Command):
         self.execute(args)
 
     def invoke(self, argstr, from_tty=False):
+        # Account the target's I/O to this command if it keeps statistics
+        stats = getattr(gdb.current_target(), 'command_stats', None)
+        if stats is not None:
+            stats.begin(self.name)
         try:
             self.invoke_uncaught(argstr, from_tty)
         except CrashCommandLineError as e:
             print("{}: {}".format(self.name, str(e)))
         except (SystemExit, KeyboardInterrupt):
             pass
+        finally:
+            if stats is not None:
+                stats.end()
 
     def execute(self, argv):
         raise NotImplementedError("CrashCommand should not be called directly")
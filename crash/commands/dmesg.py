@@ -10,9 +10,11 @@ import sys
 import os.path
 import argparse
 import re
+import struct
 
 from crash.commands import CrashCommand, CrashCommandParser
 from crash.exceptions import DelayedAttributeError
+from crash.util import TypesUtilClass
 
 if sys.version_info.major >= 3:
     long = int
@@ -175,17 +177,71 @@ EXAMPLES
 
         return '\n'.join(lines)
 
-    def log_from_idx(self, logbuf, idx, dict_needed=False):
-        msg = (logbuf + idx).cast(self.printk_log_p_type)
+    # The integer members of struct printk_log that are decoded
+    record_members = [ 'ts_nsec', 'len', 'text_len', 'dict_len' ]
 
-        try:
-            textval = (msg.cast(self.char_p_type) +
-                       self.printk_log_p_type.target().sizeof)
-            text = textval.string(length=long(msg['text_len']))
-        except UnicodeDecodeError as e:
-            print(e)
+    @classmethod
+    def setup_record_layout(cls):
+        """
+        Precomputes how to decode the header of each log record
+
+        The integer members are decoded with a single struct.Struct
+        and the level, a bitfield, is extracted from the byte holding it.
+        """
+        if hasattr(cls, 'record_header_size'):
+            return
 
-        msglen = int(msg['len'])
+        codes = { 1 : 'B', 2 : 'H', 4 : 'I', 8 : 'Q' }
+        order = TypesUtilClass.target_byte_order()
+        log_type = cls.printk_log_p_type.target()
+        fields = dict((field.name, field) for field in log_type.fields())
+
+        members = sorted(cls.record_members,
+                         key=lambda name: fields[name].bitpos)
+        fmt = order
+        pos = 0
+        for name in members:
+            offset = fields[name].bitpos // 8
+            fmt += 'x' * (offset - pos)
+            fmt += codes[fields[name].type.sizeof]
+            pos = offset + fields[name].type.sizeof
+        cls.record_order = members
+        cls.record_struct = struct.Struct(fmt)
+
+        level = fields['level']
+        bit = level.bitpos % 8
+        if order == '>':
+            bit = 8 - bit - level.bitsize
+        cls.level_byte = struct.Struct('B')
+        cls.level_offset = level.bitpos // 8
+        cls.level_shift = bit
+        cls.level_mask = (1 << level.bitsize) - 1
+
+        cls.record_header_size = log_type.sizeof
+
+    def read_log_buf(self):
+        """
+        Reads the whole log buffer at once
+
+        Returns:
+            memoryview: The contents of the buffer
+        """
+        buf = gdb.selected_inferior().read_memory(long(self.log_buf),
+                                                  long(self.log_buf_len))
+        return memoryview(buf)
+
+    def log_from_idx(self, buf, idx, dict_needed=False):
+        header = self.record_struct.unpack_from(buf, idx)
+        values = dict(zip(self.record_order, header))
+
+        level = self.level_byte.unpack_from(buf, idx + self.level_offset)[0]
+        level = (level >> self.level_shift) & self.level_mask
+
+        start = idx + self.record_header_size
+        textlen = values['text_len']
+        text = buf[start:start + textlen].tobytes().decode('utf-8', 'replace')
+
+        msglen = values['len']
 
         # A zero-length message means we wrap back to the beginning
         if msglen == 0:
@@ -193,31 +249,22 @@ EXAMPLES
         else:
             nextidx = idx + msglen
 
-        textlen = int(msg['text_len'])
-
         msgdict = {
-            'text' : text[0:textlen],
-            'timestamp' : long(msg['ts_nsec']),
-            'level' : int(msg['level']),
+            'text' : text,
+            'timestamp' : long(values['ts_nsec']),
+            'level' : level,
             'next' : nextidx,
             'dict' : [],
         }
 
         if dict_needed:
-            dict_len = int(msg['dict_len'])
-            d = (msg.cast(self.char_p_type) +
-                 self.printk_log_p_type.target().sizeof + textlen)
-            s = ''
-
-            for i in range(0, dict_len):
-                if d[i]:
-                    s += chr(d[i])
-                else:
-                    msgdict['dict'].append(s)
-                    s = ''
-
-            if s != '':
-                msgdict['dict'].append(s)
+            start += textlen
+            data = buf[start:start + values['dict_len']].tobytes()
+            entries = data.decode('utf-8', 'replace').split('\0')
+            if entries[-1] == '':
+                entries.pop()
+            msgdict['dict'] = entries
+
         return msgdict
 
     def get_log_msgs(self, dict_needed=False):
@@ -229,17 +276,20 @@ EXAMPLES
         if self.clear_seq < self.log_first_seq:
             self.clear_seq = self.log_first_seq
 
+        self.setup_record_layout()
+        buf = self.read_log_buf()
 
         seq = self.clear_seq
         idx = self.log_first_idx
 
         while seq < self.log_next_seq:
-            msg = self.log_from_idx(self.log_buf, idx, dict_needed)
+            msg = self.log_from_idx(buf, idx, dict_needed)
             seq += 1
             idx = msg['next']
             yield msg
 
     def handle_structured_log(self, args):
+        lines = []
         for msg in self.get_log_msgs(args.d):
             timestamp = ''
             if not args.t:
@@ -252,10 +302,13 @@ EXAMPLES
                 level = '<{:d}>'.format(msg['level'])
 
             for line in msg['text'].split('\n'):
-                print('{}{}{}'.format(level, timestamp, line))
+                lines.append('{}{}{}'.format(level, timestamp, line))
 
             for d in msg['dict']:
-                print('{}'.format(d.encode('string_escape')))
+                lines.append('{}'.format(d.encode('string_escape')))
+
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
 
     def handle_logbuf(self, args):
         if self.log_buf_len and self.log_buf:
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gdb
+import sys
+import textwrap
+
+from crash.commands import CrashCommand, CrashCommandParser
+from crash.commands import CrashCommandLineError
+from crash.commands.ps import PSCommand
+import crash.cache.tasks
+import crash.kernel
+
+class ForeachCommand(CrashCommand):
+    """display the backtraces of many tasks, grouped by stack
+
+NAME
+  foreach - display the backtraces of many tasks, grouped by stack
+
+SYNOPSIS
+  foreach [-r] [pid | taskp | command] ... bt
+
+DESCRIPTION
+  This command unwinds the stack of every task, or of the tasks
+  selected by pid, task_struct address or command name, and prints
+  each distinct stack once.  Each stack is preceded by the number of
+  tasks that share it and their pids.  Stacks shared by the most tasks
+  are printed first.
+
+  Stacks are compared by the return addresses of their frames.  Each
+  task is only unwound once per session, so repeating the command, or
+  running it on a subset of the tasks, doesn't unwind them again.
+
+  bt is the only command that can be applied to each task.
+
+    -r  Discard the saved stacks and unwind every task again.
+
+EXAMPLES
+  Group the stacks of all tasks:
+
+    py-crash> pyforeach bt
+    4 tasks: 10 11 12 13
+     #0  ffffffff8168a6c9 in __schedule
+     #1  ffffffff8168ad49 in schedule
+     #2  ffffffff810b0d0a in smpboot_thread_fn
+     #3  ffffffff810a5b8f in kthread
+     #4  ffffffff81695a18 in ret_from_fork
+
+  Group the stacks of the tasks named "java":
+
+    py-crash> pyforeach java bt
+"""
+    # Stacks deeper than this are truncated
+    max_frames = 256
+
+    def __init__(self, name):
+        parser = CrashCommandParser(prog=name)
+
+        parser.add_argument('-r', action='store_true', default=False)
+        parser.add_argument('args', nargs='+')
+
+        parser.format_usage = lambda: \
+            "foreach [-r] [pid | taskp | command] ... bt\n"
+        CrashCommand.__init__(self, name, parser)
+
+        # The return addresses of each task's stack, keyed by the
+        # address of its task_struct
+        self.stacks = {}
+        # The function name for each return address seen
+        self.symbols = {}
+
+    def unwind(self, task):
+        """
+        Unwinds the stack of a task
+
+        Returns:
+            tuple of long: The pc of each frame, innermost first.  The
+                tuple is empty if the stack couldn't be unwound.
+        """
+        task.thread.switch()
+
+        pcs = []
+        try:
+            frame = gdb.newest_frame()
+            while frame is not None and len(pcs) < self.max_frames:
+                pc = frame.pc()
+                if pc == 0:
+                    break
+                pcs.append(pc)
+                if pc not in self.symbols:
+                    self.symbols[pc] = frame.name()
+                frame = frame.older()
+        except gdb.error:
+            pass
+        return tuple(pcs)
+
+    def task_stack(self, pid):
+        table = crash.cache.tasks.task_table
+        address = table.address[table.row(pid)]
+        try:
+            return self.stacks[address]
+        except KeyError:
+            pass
+
+        stack = self.unwind(crash.cache.tasks.get_task(pid))
+        self.stacks[address] = stack
+        return stack
+
+    def group_stacks(self, pids):
+        """
+        Groups tasks by their stacks
+
+        Returns:
+            list of (tuple of long, list of int): Each distinct stack and
+                the pids that share it, most common first
+        """
+        # Unwinding the stacks needs the symbols for any module on them,
+        # which are found for all of the tasks at once
+        table = crash.cache.tasks.task_table
+        crash.kernel.load_modules_for_tasks([ pid for pid in pids
+                        if table.address[table.row(pid)] not in self.stacks ])
+
+        groups = {}
+        saved = gdb.selected_thread()
+        try:
+            for pid in pids:
+                groups.setdefault(self.task_stack(pid), []).append(pid)
+        finally:
+            if saved is not None and saved.is_valid():
+                saved.switch()
+
+        return sorted(groups.items(), key=lambda item: (-len(item[1]),
+                                                        item[1][0]))
+
+    def format_group(self, stack, pids):
+        count = len(pids)
+        lines = textwrap.wrap("{} task{}: {}".format(count,
+                                                     "s" if count > 1 else "",
+                                                     " ".join(map(str, pids))),
+                              width=72, subsequent_indent="  ")
+        if not stack:
+            lines.append("  (unable to unwind the stack)")
+        for num, pc in enumerate(stack):
+            name = self.symbols.get(pc)
+            if name is None:
+                name = "??"
+            lines.append(" #{:<2d} {:016x} in {}".format(num, pc, name))
+        return "\n".join(lines)
+
+    def execute(self, argv):
+        if argv.args[-1] != 'bt':
+            raise CrashCommandLineError("bt is the only supported command")
+
+        if argv.r:
+            self.stacks = {}
+            self.symbols = {}
+
+        selectors = argv.args[:-1]
+        if selectors:
+            pids = PSCommand.select_pids(selectors)
+        else:
+            pids = crash.cache.tasks.task_pids()
+        pids = [ pid for pid in pids if pid in crash.cache.tasks.task_table ]
+
+        groups = self.group_stacks(pids)
+        out = [ self.format_group(stack, members)
+                for stack, members in groups ]
+        sys.stdout.write("\n\n".join(out) + "\n")
+
+ForeachCommand("foreach")
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gdb
+from crash.commands import CrashCommand, CrashCommandParser
+import crash.kernel
+
+class LoadModulesCommand(CrashCommand):
+    """load module symbols that were deferred
+
+NAME
+  load-modules - load module symbols that were deferred
+
+SYNOPSIS
+  load-modules [-v] [address ...]
+
+DESCRIPTION
+  When crash-python is started with --lazy-modules, the symbols for each
+  module are only loaded when they are first needed.  This command loads
+  them explicitly.
+
+  With no arguments, the symbols for every module that hasn't been
+  loaded yet are loaded.  Otherwise, only the modules containing the
+  given addresses are loaded.
+
+    -v  Report each module as it is loaded.
+
+EXAMPLES
+    py-crash> pyload-modules
+    py-crash> pyload-modules 0xffffffffa0123456
+"""
+    def __init__(self, name):
+        parser = CrashCommandParser(prog=name)
+
+        parser.add_argument('-v', action='store_true', default=False)
+        parser.add_argument('address', nargs='*')
+
+        parser.format_usage = lambda: "load-modules [-v] [address ...]\n"
+        CrashCommand.__init__(self, name, parser)
+
+    def execute(self, args):
+        if not args.address:
+            crash.kernel.load_pending_modules(args.v)
+            return
+
+        for address in args.address:
+            addr = int(address, 16)
+            if crash.kernel.load_module_for_address(addr):
+                if args.v:
+                    print("Loaded module for {:#x}".format(addr))
+            elif args.v:
+                print("No unloaded module contains {:#x}".format(addr))
+
+LoadModulesCommand("load-modules")
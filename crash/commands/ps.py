@@ -8,13 +8,18 @@ from __future__ import division
 import gdb
 import argparse
 import sys
+import re
 
 if sys.version_info.major >= 3:
     long = int
 
 from crash.commands import CrashCommand, CrashCommandParser
 from crash.commands import CrashCommandLineError
-from crash.types.task import LinuxTask, TaskStateFlags as TF
+from crash.types.task import LinuxTask, TaskStateFlags as TF, PF_EXITING
+from crash.types.percpu import get_percpu_var
+from crash.util import array_size, read_fields
+import crash.cache.tasks
+import crash.cache.vm
 
 class PSCommand(CrashCommand):
     """display process status information
@@ -81,7 +86,8 @@ DESCRIPTION
            recently-run task (largest last_run/timestamp) shown first,
            followed by the task's current state.
        -a  display the command line arguments and environment strings of
-           selected, or all, user-mode tasks.
+           selected, or all, user-mode tasks.  (Not supported; user memory
+           is not available in most dumps.)
        -g  display tasks by thread group, of selected, or all, tasks.
        -r  display resource limits (rlimits) of selected, or all, tasks.
        -n  display gdb thread number
@@ -388,6 +394,13 @@ EXAMPLES
           15      2   2  ffff880212989710  IN   0.0      0      0  [migration/2]
           20      2   3  ffff8802129a9710  IN   0.0      0      0  [migration/3]
         """
+    task_header_template = "PID: {0:-5d}  TASK: {1:x}  CPU: {2:>2d}  COMMAND: \"{3}\""
+    hex_pattern = re.compile('^(0x)?[0-9a-fA-F]+$')
+    regex_chars = re.compile(r'[][*?+^$.|(){}\\]')
+    rlimit_names = [ 'CPU', 'FSIZE', 'DATA', 'STACK', 'CORE', 'RSS', 'NPROC',
+                     'NOFILE', 'MEMLOCK', 'AS', 'LOCKS', 'SIGPENDING',
+                     'MSGQUEUE', 'NICE', 'RTPRIO', 'RTTIME' ]
+
     def __init__(self):
         parser = CrashCommandParser(prog="ps")
 
@@ -431,8 +444,7 @@ EXAMPLES
         self.num_line_template = "{0} {1:>5}   {2:>5}  {3:>3}  {4:{5}d}  {6:3}  {7:.1f}"
         self.num_line_template += " {8:7d} {9:6d}  {10:.{11}}{12}{13:.{14}}"
 
-    def task_state_string(self, task):
-        state = task.task_state()
+    def state_string(self, state):
         buf = None
         exclusive = False
 
@@ -449,7 +461,7 @@ EXAMPLES
             except KeyError:
                 pass
 
-            if state & TF.TASK_DEAD and task.maybe_dead():
+            if state & TF.TASK_DEAD and LinuxTask.state_maybe_dead(state):
                 buf = self.task_states[TF.TASK_DEAD]
 
         if buf is not None and exclusive:
@@ -457,71 +469,141 @@ EXAMPLES
 
         return buf
 
-    @classmethod
-    def task_header(cls, task):
-        task_struct = task.task_struct
-        template = "PID: {0:-5d}  TASK: {1:x}  CPU: {2:>2d}  COMMAND: \"{3}\""
-        cpu = task.get_last_cpu()
-        if task.active:
-            cpu = task.cpu
-        return template.format(int(task_struct['pid']),
-                               long(task_struct.address), cpu,
-                               task_struct['comm'].string())
-
-    def print_last_run(self, task):
-        radix = 10
-        if radix == 10:
-            radix_string = "d"
-        else:
-            radix_string = "x"
-        template = "[{0:{1}}] [{2}]  {3}"
-        print(template.format(task.last_run(), radix_string,
-                              self.task_state_string(task),
-                              self.task_header(task)))
-
-    def print_one(self, argv, thread):
-        task = thread.info
-        specified = argv.args is None
-        task_struct = task.task_struct
+    def last_run_spec(self):
+        fields = LinuxTask.task_struct_type.keys()
+        if ('sched_info' in fields and
+                'last_arrival' in LinuxTask.task_struct_type['sched_info'].type.keys()):
+            return 'sched_info.last_arrival'
+        elif 'last_run' in fields:
+            return 'last_run'
+        return 'timestamp'
 
-        pointer = task_struct.address
-        if argv.s:
-            pointer = task.get_stack_pointer()
+    def collect_rows(self, argv, pids):
+        """
+        Gathers everything ps displays for a set of tasks
 
-        if argv.n:
-            pointer = thread.num
+        The table columns are used where possible and the remaining
+        task_struct members for all tasks are read in one batch, so no
+        gdb.Values are created for tasks that don't need them.
 
+        Returns:
+            list of (tuple, dict): The sort key and the column values
+                for each task that passes the -k/-u filters
+        """
+        table = crash.cache.tasks.task_table
+        specs = ['mm', 'flags']
         if argv.l:
-            self.print_last_run(task)
-            return
+            specs.append(self.last_run_spec())
+
+        addresses = [ table.address[table.row(pid)] for pid in pids ]
+        fields = read_fields(addresses, LinuxTask.task_struct_type, specs)
+
+        init_mm = 0
+        if LinuxTask.init_mm is not None:
+            init_mm = long(LinuxTask.init_mm.address)
+
+        rows = []
+        for pid, address, values in zip(pids, addresses, fields):
+            mm, flags = values[0] or 0, values[1] or 0
+            row = table.row(pid)
+            state = table.state[row]
+
+            gone = (state & TF.TASK_ZOMBIE) or (flags & PF_EXITING)
+            if pid == 0:
+                kernel = True
+            elif gone:
+                kernel = False
+            else:
+                kernel = mm == 0 or mm == init_mm
 
-        try:
-            parent_pid = task_struct['parent']['pid']
-        except KeyError:
-            # This can happen on live systems where pids have gone
-            # away
-            print("Couldn't locate task at address {:#x}"
-                  .format(task_struct.parent.address))
-            return
+            if argv.k and not kernel:
+                continue
+            if argv.u and kernel:
+                continue
+
+            rss = total_vm = 0
+            if not kernel and not gone and mm:
+                rss, total_vm = self.mem_usage(pid, mm)
+
+            task = crash.cache.tasks.tasks.get(pid)
+
+            pointer = address
+            if argv.s:
+                task = crash.cache.tasks.get_task(pid)
+                pointer = task.get_stack_pointer()
+            elif argv.n:
+                task = crash.cache.tasks.get_task(pid)
+                pointer = task.thread.num
+
+            columns = {
+                'pid' : pid,
+                'ppid' : table.parent_pid(pid) or 0,
+                'cpu' : self.task_cpu(pid),
+                'address' : address,
+                'pointer' : pointer,
+                'active' : task is not None and task.active,
+                'state' : self.state_string(state),
+                'rss' : rss,
+                'total_vm' : total_vm,
+                'kernel' : kernel,
+                'comm' : table.comm_for_pid(pid),
+            }
+
+            if argv.l:
+                key = (-(values[2] or 0), pid)
+                columns['last_run'] = values[2] or 0
+            else:
+                key = (pid,)
+            rows.append((key, columns))
+        return rows
+
+    @staticmethod
+    def mem_usage(pid, mm):
+        table = crash.cache.tasks.task_table
+        row = table.row(pid)
+        if table.rss[row] >= 0:
+            return (table.rss[row], table.total_vm[row])
+
+        threads = None
+        if LinuxTask.task_rss_stat is not None:
+            threads = [ table.address[table.row(thread)]
+                        for thread in table.thread_group(table.tgid[row]) ]
+        rss, total_vm, pgd = LinuxTask.mm_usage(mm, threads)
+        table.set_mem_usage(pid, rss, total_vm)
+        return (rss, total_vm)
+
+    @staticmethod
+    def percent_mem(rss):
+        totalram = crash.cache.vm.cache.totalram_pages
+        if not totalram:
+            return 0.0
+        return rss * 100.0 / totalram
+
+    def format_row(self, argv, columns):
+        if argv.l:
+            header = self.task_header_template.format(columns['pid'],
+                                                      columns['address'],
+                                                      columns['cpu'],
+                                                      columns['comm'])
+            return "[{0:d}] [{1}]  {2}".format(columns['last_run'],
+                                               columns['state'], header)
 
-        if task.active:
-            active = ">"
-        else:
-            active = " "
         line = self.line_template
         width = 16
         if argv.n:
             line = self.num_line_template
             width = 7
 
-        print(line.format(active, int(task_struct['pid']), int(parent_pid),
-                          int(task.get_last_cpu()), long(pointer),
-                          width, self.task_state_string(task), 0,
-                          task.total_vm * 4096 // 1024,
-                          task.rss * 4096 // 1024,
-                          "[", int(task.is_kernel_task()),
-                          task_struct['comm'].string(),
-                          "]", int(task.is_kernel_task())))
+        active = ">" if columns['active'] else " "
+        kernel = int(columns['kernel'])
+        page_size = crash.cache.vm.cache.page_size
+        return line.format(active, columns['pid'], columns['ppid'],
+                           columns['cpu'], long(columns['pointer']), width,
+                           columns['state'],
+                           self.percent_mem(columns['rss']),
+                           columns['total_vm'] * page_size // 1024,
+                           columns['rss'] * page_size // 1024,
+                           "[", kernel, columns['comm'], "]", kernel)
 
     def setup_task_states(self):
         self.task_states = {
@@ -541,20 +623,210 @@ EXAMPLES
         if hasattr(TF, 'TASK_TRACING_STOPPED'):
             self.task_states[TF.TASK_TRACING_STOPPED] = "TR"
 
-    def execute(self, argv):
-        sort_by_pid = lambda x: x.info.task_struct['pid']
-        sort_by_last_run = lambda x: -x.info.last_run()
+    def table_header(self, pid):
+        """
+        Formats the PID/TASK/CPU/COMMAND line for a task from the task
+        table without setting the task up
+        """
+        table = crash.cache.tasks.task_table
+        row = table.row(pid)
+        return self.task_header_template.format(pid, table.address[row],
+                                                self.task_cpu(pid),
+                                                table.comm_for_pid(pid))
+
+    @staticmethod
+    def task_cpu(pid):
+        # Deferred tasks are never active, so only set up tasks can
+        # have a cpu other than the one in the table.
+        task = crash.cache.tasks.tasks.get(pid)
+        if task is not None and task.active:
+            return task.cpu
+        table = crash.cache.tasks.task_table
+        return table.cpu[table.row(pid)]
+
+    @classmethod
+    def select_pids(cls, args):
+        """
+        Resolves pid, taskp and command arguments to pids
+
+        Pids are returned in the order the arguments select them.
+
+        Raises:
+            CrashCommandLineError: An argument didn't select any task
+        """
+        table = crash.cache.tasks.task_table
+        pids = []
+        seen = set()
+        for arg in args:
+            matches = []
+            if arg.startswith('\\'):
+                matches = table.pids_for_comm(arg[1:])
+            elif arg.isdigit():
+                if int(arg) in table:
+                    matches = [int(arg)]
+            else:
+                if cls.hex_pattern.match(arg):
+                    try:
+                        matches = [table.pid_for_address(int(arg, 16))]
+                    except KeyError:
+                        pass
+                if not matches:
+                    matches = table.pids_for_comm(arg)
+                if not matches and cls.regex_chars.search(arg):
+                    try:
+                        matches = table.pids_matching_comm(arg)
+                    except re.error as e:
+                        raise CrashCommandLineError("invalid regular "
+                                                    "expression '{}': {}"
+                                                    .format(arg, str(e)))
+            if not matches:
+                raise CrashCommandLineError("invalid task, pid or command: {}"
+                                            .format(arg))
+            for pid in matches:
+                if pid not in seen:
+                    seen.add(pid)
+                    pids.append(pid)
+        return pids
+
+    def print_parents(self, pids):
+        table = crash.cache.tasks.task_table
+        for n, pid in enumerate(pids):
+            if n:
+                print()
+            chain = [pid]
+            parent = table.parent_pid(pid)
+            while parent is not None and parent not in chain:
+                chain.append(parent)
+                parent = table.parent_pid(parent)
+            for depth, ancestor in enumerate(reversed(chain)):
+                print("{}{}".format(" " * depth, self.table_header(ancestor)))
+
+    def print_children(self, pids):
+        table = crash.cache.tasks.task_table
+        for n, pid in enumerate(pids):
+            if n:
+                print()
+            print(self.table_header(pid))
+            children = table.children(pid)
+            if not children:
+                print("  (no children)")
+            for child in children:
+                print("  {}".format(self.table_header(child)))
+
+    def print_thread_groups(self, pids):
+        table = crash.cache.tasks.task_table
+        tgids = []
+        for pid in pids:
+            tgid = table.tgid[table.row(pid)]
+            if tgid not in tgids:
+                tgids.append(tgid)
+
+        for n, tgid in enumerate(tgids):
+            if n:
+                print()
+            if tgid in table:
+                print(self.table_header(tgid))
+            for pid in table.thread_group(tgid):
+                if pid != tgid:
+                    print("  {}".format(self.table_header(pid)))
+
+    @staticmethod
+    def time_ns(value):
+        if value.type.code == gdb.TYPE_CODE_STRUCT:
+            return long(value['tv_sec']) * 1000000000 + long(value['tv_nsec'])
+        return long(value)
+
+    @staticmethod
+    def format_run_time(ns):
+        secs = ns // 1000000000
+        days = secs // 86400
+        secs %= 86400
+        return "{} days, {:02d}:{:02d}:{:02d}".format(days, secs // 3600,
+                                                      (secs // 60) % 60,
+                                                      secs % 60)
+
+    def print_times(self, pids):
+        # The runqueue clocks are the closest thing to "now" in a dump
+        now = None
+        try:
+            rqs = get_percpu_var(gdb.lookup_global_symbol('runqueues'))
+            now = max(long(rq['clock']) for rq in rqs.values())
+        except (gdb.error, AttributeError, ValueError):
+            pass
+
+        for pid in pids:
+            task_struct = crash.cache.tasks.get_task(pid).task_struct
+            start = self.time_ns(task_struct['start_time'])
+            print(self.table_header(pid))
+            if now is not None and now >= start:
+                print("    RUN TIME: {}".format(self.format_run_time(now - start)))
+            print("  START TIME: {}".format(start))
+            print("       UTIME: {}".format(long(task_struct['utime'])))
+            print("       STIME: {}".format(long(task_struct['stime'])))
+
+    def print_rlimits(self, pids):
+        for n, pid in enumerate(pids):
+            if n:
+                print()
+            task_struct = crash.cache.tasks.get_task(pid).task_struct
+            print(self.table_header(pid))
+            print("   RLIMIT     CURRENT       MAXIMUM")
+            rlim = task_struct['signal']['rlim']
+            infinity = (1 << (rlim[0]['rlim_cur'].type.sizeof * 8)) - 1
+            for i in range(array_size(rlim)):
+                name = "{}".format(i)
+                if i < len(self.rlimit_names):
+                    name = self.rlimit_names[i]
+                values = []
+                for field in ['rlim_cur', 'rlim_max']:
+                    value = long(rlim[i][field])
+                    if value == infinity:
+                        values.append("(unlimited)")
+                    else:
+                        values.append(str(value))
+                print("{:>9}  {:^11} {:^13}".format(name, *values))
 
+    def execute(self, argv):
         if not hasattr(self, 'task_states'):
             try:
                 self.setup_task_states()
             except AttributeError:
                 raise CrashCommandLineError("The task subsystem is not available.")
 
-        sort_by = sort_by_pid
-        if argv.l:
-            sort_by = sort_by_last_run
+        if argv.a:
+            raise CrashCommandLineError("-a is not supported: user memory "
+                                        "is not available in most dumps")
+
+        table = crash.cache.tasks.task_table
+        if argv.args:
+            pids = self.select_pids(argv.args)
         else:
+            pids = crash.cache.tasks.task_pids()
+
+        if argv.G:
+            pids = [ pid for pid in pids
+                     if pid not in table or table.tgid[table.row(pid)] == pid ]
+
+        if argv.p or argv.c or argv.g:
+            pids = [ pid for pid in pids if pid in table ]
+            if argv.p:
+                self.print_parents(pids)
+            elif argv.c:
+                self.print_children(pids)
+            else:
+                self.print_thread_groups(pids)
+            return
+
+        if argv.t:
+            self.print_times(pids)
+            return
+
+        if argv.r:
+            self.print_rlimits(pids)
+            return
+
+        lines = []
+        if not argv.l:
             if argv.s:
                 col4name = "KSTACK"
                 width = 16
@@ -564,20 +836,15 @@ EXAMPLES
             else:
                 col4name = "TASK"
                 width = 16
-            print(self.header_template.format(width, col4name))
-
-        if not argv.args:
-            for thread in sorted(gdb.selected_inferior().threads(), key=sort_by):
-                task = thread.info
-                if task:
-                    if argv.k and not task.is_kernel_task():
-                        continue
-                    if argv.u and task.is_kernel_task():
-                        continue
-
-                    # Only show thread group leaders
-#                    if argv.G and task.pid != int(task.task_struct['tgid']):
-
-                    task.update_mem_usage()
-                    self.print_one(argv, thread)
+            lines.append(self.header_template.format(width, col4name))
+
+        rows = self.collect_rows(argv, [ pid for pid in pids if pid in table ])
+
+        # Selected tasks are shown in the order they were requested
+        if not argv.args or argv.l:
+            rows.sort(key=lambda row: row[0])
+
+        lines += [ self.format_row(argv, columns) for key, columns in rows ]
+        sys.stdout.write("\n".join(lines) + "\n")
+
 PSCommand()
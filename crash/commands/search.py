@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gdb
+import sys
+
+from crash.commands import CrashCommand, CrashCommandParser
+from crash.commands import CrashCommandLineError
+from crash.commands.ps import PSCommand
+from crash.types.stack import search_stacks
+import crash.cache.tasks
+
+class SearchCommand(CrashCommand):
+    """search task stacks for values
+
+NAME
+  search - search task stacks for values
+
+SYNOPSIS
+  search -t [-p pid | taskp | command] ... value ...
+
+DESCRIPTION
+  This command searches the kernel stacks of tasks for words that
+  contain any of the given values, e.g. the address of a lock, an
+  inode or a request.  For each task with a match, the task is shown
+  followed by the address of each matching word, its offset within the
+  stack and its value.
+
+  Each stack is read in one piece and stacks are read in batches, so a
+  search of every task is quick even on dumps with many thousands of
+  tasks.
+
+    -t  Search the kernel stacks of tasks.  This is currently the only
+        kind of search and must be given.
+
+    -p  Only search the stacks of the given task.  The task may be given
+        as a pid, a task_struct address or a command name, as with ps.
+        May be given more than once.
+
+EXAMPLES
+  Find the tasks with a mutex on their stacks:
+
+    py-crash> pysearch -t ffff88022a5f6e08
+    PID:  1453  TASK: ffff880226a4d180  CPU:  2  COMMAND: "mysqld"
+    ffff8802240cbd48 (+0x3d48): ffff88022a5f6e08
+    ffff8802240cbd80 (+0x3d80): ffff88022a5f6e08
+
+    PID:  1490  TASK: ffff880226a4e0c0  CPU:  0  COMMAND: "mysqld"
+    ffff880223e9fd48 (+0x3d48): ffff88022a5f6e08
+"""
+    def __init__(self, name):
+        parser = CrashCommandParser(prog=name)
+
+        parser.add_argument('-t', action='store_true', default=False)
+        parser.add_argument('-p', action='append', default=[])
+        parser.add_argument('value', nargs='+')
+
+        parser.format_usage = lambda: \
+            "search -t [-p pid | taskp | command] ... value ...\n"
+        CrashCommand.__init__(self, name, parser)
+
+    def execute(self, argv):
+        if not argv.t:
+            raise CrashCommandLineError("only task stacks can be searched; "
+                                        "use -t")
+
+        values = []
+        for value in argv.value:
+            try:
+                values.append(int(value, 16))
+            except ValueError:
+                raise CrashCommandLineError("invalid value: {}".format(value))
+
+        pids = None
+        if argv.p:
+            pids = PSCommand.select_pids(argv.p)
+
+        table = crash.cache.tasks.task_table
+        out = []
+        last = None
+        for pid, stack, offset, value in search_stacks(values, pids):
+            if pid != last:
+                if last is not None:
+                    out.append("")
+                row = table.row(pid)
+                out.append(PSCommand.task_header_template.format(pid,
+                                                table.address[row],
+                                                PSCommand.task_cpu(pid),
+                                                table.comm_for_pid(pid)))
+                last = pid
+            out.append("{:016x} (+{:#x}): {:016x}".format(stack + offset,
+                                                          offset, value))
+
+        if out:
+            sys.stdout.write("\n".join(out) + "\n")
+
+SearchCommand("search")
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gdb
+from crash.commands import CrashCommand, CrashCommandParser
+import crash.infra.profiler
+
+def ratio(part, whole):
+    if whole == 0:
+        return 0.0
+    return 100.0 * part / whole
+
+class StatCommand(CrashCommand):
+    """display memory read statistics
+
+NAME
+  stat - display memory read statistics
+
+SYNOPSIS
+  stat [-c] [-r] [-s] [-o <file>]
+
+DESCRIPTION
+  This command displays the counters kept by the dump file target: the
+  number and size of reads issued to libkdumpfile, the time spent in
+  them, the errors they returned, and how effective the page cache,
+  read-ahead and translation cache were.  The counters cover the
+  session since startup or since they were last reset.
+
+    -c  Also display the counters broken down by the command that
+        caused the reads.
+    -r  Reset the counters after displaying them.
+    -s  Display the time and reads spent in each phase of startup and
+        the modules that were slowest to load.
+    -o <file>
+        Save the startup profile to a file as JSON.
+
+EXAMPLES
+  Display the counters for the commands run so far and start over:
+
+    py-crash> pystat -c -r
+"""
+    def __init__(self, name):
+        parser = CrashCommandParser(prog=name)
+
+        parser.add_argument('-c', action='store_true', default=False)
+        parser.add_argument('-r', action='store_true', default=False)
+        parser.add_argument('-s', action='store_true', default=False)
+        parser.add_argument('-o', metavar='file')
+
+        parser.format_usage = lambda: "stat [-c] [-r] [-s] [-o <file>]\n"
+        CrashCommand.__init__(self, name, parser)
+
+    @staticmethod
+    def show_reads(stats):
+        kdump = stats['kdump']
+        print("Dump file reads: {:d} ({:d} bytes, {:.3f}s)"
+              .format(kdump['reads'], kdump['bytes'], kdump['time']))
+        if kdump['sizes']:
+            print("  Read sizes:")
+            for size in sorted(kdump['sizes']):
+                print("    <= {:>10d}: {:d}".format(size, kdump['sizes'][size]))
+        if kdump['errors']:
+            print("  Errors:")
+            for name in sorted(kdump['errors']):
+                print("    {}: {:d}".format(name, kdump['errors'][name]))
+
+    @staticmethod
+    def show_caches(stats):
+        pc = stats['page_cache']
+        lookups = pc['hits'] + pc['misses']
+        print("Page cache: {:d} hits, {:d} misses ({:.1f}% hit rate), "
+              "{:d} evictions, {:d} bypassed, {:d}/{:d} pages"
+              .format(pc['hits'], pc['misses'], ratio(pc['hits'], lookups),
+                      pc['evictions'], pc['bypassed'], pc['pages'],
+                      pc['max_pages']))
+        print("Negative cache: {:d} hits, {:d} pages, {:.3f}s saved"
+              .format(pc['negative_hits'], pc['negative_pages'],
+                      pc['negative_time_saved']))
+        print("Read-ahead: {:d} reads, {:d} pages prefetched, "
+              "{:d} used, {:d} wasted"
+              .format(pc['readahead_issued'], pc['readahead_pages'],
+                      pc['readahead_hits'], pc['readahead_wasted']))
+
+        tlb = stats['tlb']
+        lookups = tlb['hits'] + tlb['misses']
+        print("Translation cache: {:d} hits, {:d} misses ({:.1f}% hit rate), "
+              "{:d} entries"
+              .format(tlb['hits'], tlb['misses'], ratio(tlb['hits'], lookups),
+                      tlb['entries']))
+
+        if 'elf_map' in stats:
+            print("ELF mapping: {:d} reads ({:d} bytes)"
+                  .format(stats['elf_map']['reads'],
+                          stats['elf_map']['bytes']))
+
+    @staticmethod
+    def show_commands(commands):
+        print("{:<16} {:>6} {:>10} {:>12} {:>9} {:>7}"
+              .format("COMMAND", "CALLS", "READS", "BYTES", "TIME", "HIT%"))
+        for name in sorted(commands):
+            cmd = commands[name]
+            pc = cmd['page_cache']
+            print("{:<16} {:>6d} {:>10d} {:>12d} {:>8.3f}s {:>6.1f}%"
+                  .format(name, cmd['invocations'], cmd['kdump']['reads'],
+                          cmd['kdump']['bytes'], cmd['kdump']['time'],
+                          ratio(pc['hits'], pc['hits'] + pc['misses'])))
+
+    def execute(self, args):
+        if args.s or args.o:
+            profile = crash.infra.profiler.startup_profile
+            if profile is None:
+                print("No startup profile was recorded.")
+            else:
+                if args.s:
+                    profile.report()
+                if args.o:
+                    profile.save(args.o)
+            return
+
+        target = gdb.current_target()
+        if not hasattr(target, 'stats'):
+            print("The current target doesn't keep read statistics.")
+            return
+
+        stats = target.stats()
+        self.show_reads(stats)
+        self.show_caches(stats)
+        if args.c:
+            print()
+            self.show_commands(target.command_stats.commands)
+
+        if args.r:
+            target.reset_stats()
+
+StatCommand("stat")
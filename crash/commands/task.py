@@ -8,6 +8,7 @@ from __future__ import division
 import gdb
 from crash.commands import CrashCommand, CrashCommandParser
 import crash.cache.tasks
+import crash.kernel
 import argparse
 
 class TaskCommand(CrashCommand):
@@ -36,7 +37,10 @@ EXAMPLES
 
     def execute(self, args):
         try:
-            thread = crash.cache.tasks.get_task(args.pid[0]).thread
+            task = crash.cache.tasks.get_task(args.pid[0])
+            # Unwinding the stack needs the symbols for any module on it
+            crash.kernel.load_modules_for_task(task)
+            thread = task.thread
             gdb.execute("thread {}".format(thread.num))
         except KeyError:
             print("No such task with pid {}".format(args.pid[0]))
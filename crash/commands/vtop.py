@@ -7,6 +7,7 @@ import gdb
 import argparse
 from crash.commands import CrashCommand, CrashCommandParser
 from crash.addrxlat import addrxlat_context, addrxlat_system, addrxlat_is_non_auto
+from crash.addrxlat import addrxlat_translate
 import addrxlat
 
 class LinuxPGT(object):
@@ -200,11 +201,9 @@ EXAMPLES
 
         for addr in argv.args:
             addr = int(addr, 16)
-            fulladdr = addrxlat.FullAddress(addrxlat.KVADDR, addr)
             print('{:16}  {:16}'.format('VIRTUAL', 'PHYSICAL'))
             try:
-                fulladdr.conv(addrxlat.KPHYSADDR, ctx, sys)
-                phys = '{:x}'.format(fulladdr.addr)
+                phys = '{:x}'.format(addrxlat_translate(addr))
             except addrxlat.BaseException:
                 phys = '---'
             print('{:<16x}  {:<16}\n'.format(addr, phys))
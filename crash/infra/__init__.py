@@ -8,6 +8,7 @@ from __future__ import division
 from future.utils import with_metaclass
 
 import sys
+import time
 import glob
 import os.path
 import inspect
@@ -110,7 +111,17 @@ class _CrashBaseMeta(type):
 class CrashBaseClass(with_metaclass(_CrashBaseMeta)):
     pass
 
-def autoload_submodules(caller, callback=None):
+def _load_submodule(modname, callback, profiler):
+    start = time.time()
+    x = importlib.import_module(modname)
+    imported = time.time()
+    if callback:
+        callback(x)
+    if profiler is not None:
+        profiler.record_module(modname, imported - start,
+                               time.time() - imported)
+
+def autoload_submodules(caller, callback=None, profiler=None):
     mods = []
     try:
         mod = sys.modules[caller]
@@ -124,16 +135,12 @@ def autoload_submodules(caller, callback=None):
         if mod == '__init__':
             continue
         modname = "{}.{}".format(caller, mod)
-        x = importlib.import_module(modname)
-        if callback:
-            callback(x)
+        _load_submodule(modname, callback, profiler)
         mods.append(modname)
     packages = glob.glob("{}/[A-Za-z0-9_]*/__init__.py".format(path))
     for pkg in packages:
         modname = "{}.{}".format(caller, os.path.basename(os.path.dirname(pkg)))
-        x = importlib.import_module(modname)
-        if callback:
-            callback(x)
+        _load_submodule(modname, callback, profiler)
 
-        mods += autoload_submodules(modname, callback)
+        mods += autoload_submodules(modname, callback, profiler)
     return mods
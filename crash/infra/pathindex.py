@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import os
+import os.path
+import json
+import hashlib
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+# Bumped whenever the layout of the index file changes
+INDEX_VERSION = 1
+
+# Directory checks are latency bound, so use more threads than CPUs
+SCAN_THREADS = 16
+
+def default_cache_dir():
+    """
+    Returns the directory where search path indexes are stored
+
+    This is $XDG_CACHE_HOME/crash-python, or ~/.cache/crash-python if
+    XDG_CACHE_HOME is not set.
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'crash-python')
+
+def normalize_name(name):
+    """Module file names may use - and _ interchangeably"""
+    return name.replace('-', '_')
+
+def list_directory(path):
+    """
+    Lists the files and subdirectories of a directory
+
+    Symbolic links to directories are reported as neither, matching
+    os.walk without followlinks.
+
+    Returns:
+        (list of str, list of str): The file names and the subdirectory
+            names, or None if the directory can't be read
+    """
+    files = []
+    subdirs = []
+    try:
+        if scandir is not None:
+            # The entry types usually come with the listing, saving a
+            # stat call per entry
+            for entry in scandir(path):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                elif not entry.is_symlink():
+                    subdirs.append(entry.name)
+        else:
+            for name in os.listdir(path):
+                fullpath = os.path.join(path, name)
+                if not os.path.isdir(fullpath):
+                    files.append(name)
+                elif not os.path.islink(fullpath):
+                    subdirs.append(name)
+    except OSError:
+        return None
+    return (sorted(files), sorted(subdirs))
+
+class PathIndex(object):
+    """
+    A persistent index of the files under a search path
+
+    The index records the file names in every directory of the tree
+    along with the directory's modification time.  When the index is
+    refreshed, each directory is checked with a single stat call and
+    only directories whose modification time changed are listed again.
+    Unchanged trees therefore cost one stat per directory instead of a
+    full walk.
+
+    Args:
+        path (str): The root of the tree to index
+        cache_dir (str, optional): The directory where the index file is
+            stored.  Defaults to default_cache_dir().
+        persist (bool, optional, default=True): Whether to load and save
+            the index file
+    """
+    def __init__(self, path, cache_dir=None, persist=True):
+        self.path = os.path.abspath(path)
+        self.persist = persist
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.cache_dir = cache_dir
+        self.dirs = {}
+        self.names = {}
+        self.dirty = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.dirs_checked = 0
+        self.dirs_listed = 0
+
+    def index_file(self):
+        key = hashlib.sha1(self.path.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, "{}.json".format(key))
+
+    def load(self):
+        """
+        Loads the index file for this path, if one exists and is usable
+
+        Returns:
+            bool: Whether an index was loaded
+        """
+        if not self.persist:
+            return False
+        try:
+            with open(self.index_file(), 'r') as f:
+                data = json.load(f)
+        except (EnvironmentError, ValueError):
+            return False
+
+        if (not isinstance(data, dict) or
+                data.get('version') != INDEX_VERSION or
+                data.get('path') != self.path):
+            return False
+
+        self.dirs = data['dirs']
+        return True
+
+    def save(self):
+        """
+        Writes the index file if the index changed
+
+        Failure to write the index is not an error; the tree will just
+        be scanned again next time.
+        """
+        if not self.persist or not self.dirty:
+            return
+
+        data = {
+            'version' : INDEX_VERSION,
+            'path' : self.path,
+            'dirs' : self.dirs,
+        }
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmpname = tempfile.mkstemp(dir=self.cache_dir,
+                                           prefix='.index-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            # rename is atomic so concurrent sessions never see a partial file
+            os.rename(tmpname, self.index_file())
+        except EnvironmentError:
+            return
+        self.dirty = False
+
+    def check_directory(self, relpath, entry):
+        """
+        Brings the entry for one directory up to date
+
+        This doesn't modify the index so that it can be called from
+        several threads at once.
+
+        Args:
+            relpath (str): The directory, relative to the root
+            entry (list): The entry for the directory from the previous
+                index, or None
+
+        Returns:
+            (str, list, bool): The directory, its new entry or None if it
+                can't be read, and whether it had to be listed again
+        """
+        fullpath = os.path.join(self.path, relpath)
+        try:
+            mtime = os.stat(fullpath).st_mtime
+        except OSError:
+            return (relpath, None, False)
+
+        if entry is not None and entry[0] == mtime:
+            return (relpath, entry, False)
+
+        listing = list_directory(fullpath)
+        if listing is None:
+            return (relpath, None, True)
+        files, subdirs = listing
+        return (relpath, [mtime, files, subdirs], True)
+
+    def refresh(self, pool=None):
+        """
+        Updates the index to match the tree on disk
+
+        The tree is checked one level at a time.  With a pool, the
+        directories at each level are checked concurrently, which hides
+        the latency of network filesystems.  Directories that disappeared
+        are dropped from the index.
+
+        Args:
+            pool (multiprocessing.pool.ThreadPool, optional): The threads
+                to check directories with
+        """
+        old = self.dirs
+        self.dirs = {}
+
+        def check(relpath):
+            return self.check_directory(relpath, old.get(relpath))
+
+        level = ['']
+        while level:
+            if pool is not None and len(level) > 1:
+                results = pool.map(check, level)
+            else:
+                results = [check(relpath) for relpath in level]
+
+            level = []
+            for relpath, entry, listed in results:
+                self.dirs_checked += 1
+                if listed:
+                    self.dirs_listed += 1
+                    self.dirty = True
+                if entry is None:
+                    continue
+                self.dirs[relpath] = entry
+                level += [os.path.join(relpath, subdir)
+                          for subdir in entry[2]]
+
+        if len(self.dirs) != len(old):
+            self.dirty = True
+
+        self.build_names()
+
+    def build_names(self):
+        names = {}
+        for relpath in sorted(self.dirs):
+            for filename in self.dirs[relpath][1]:
+                names[normalize_name(filename)] = os.path.join(self.path,
+                                                               relpath,
+                                                               filename)
+        self.names = names
+
+    def update(self, pool=None):
+        """
+        Loads the saved index, refreshes it and saves it again
+
+        Args:
+            pool (multiprocessing.pool.ThreadPool, optional): The threads
+                to check directories with
+
+        Returns:
+            PathIndex: self, for chaining
+        """
+        self.load()
+        self.refresh(pool)
+        self.save()
+        return self
+
+    def lookup(self, name):
+        """
+        Finds a file in the tree by name
+
+        Args:
+            name (str): The file name to find.  - and _ are treated as
+                the same character.
+
+        Returns:
+            str: The path to the file, or None if it wasn't found
+        """
+        return self.names.get(normalize_name(name))
+
+class SearchPathScanner(object):
+    """
+    Updates the indexes for a set of search paths in the background
+
+    The directories of each tree are checked by a pool of threads.
+    The scan starts as soon as the scanner is created so that
+    it overlaps with other startup work.
+
+    Args:
+        paths (list of str): The search paths to index
+        cache_dir (str, optional): Passed to PathIndex
+        threads (int, optional, default=SCAN_THREADS): The number of
+            threads used to check directories
+    """
+    def __init__(self, paths, cache_dir=None, threads=SCAN_THREADS):
+        self.paths = [path for path in paths if path]
+        self.cache_dir = cache_dir
+        self.threads = threads
+        self.indexes = {}
+        self.error = None
+        self.thread = threading.Thread(target=self.scan)
+        # Don't hold up exiting if the session ends before the scan does
+        self.thread.daemon = True
+        self.thread.start()
+
+    def scan(self):
+        pool = ThreadPool(self.threads)
+        try:
+            for path in self.paths:
+                try:
+                    index = PathIndex(path, self.cache_dir).update(pool)
+                except Exception as e:
+                    self.error = e
+                    continue
+                self.indexes[index.path] = index
+        finally:
+            pool.close()
+            pool.join()
+
+    def wait(self):
+        """
+        Waits for the scan to finish
+
+        Returns:
+            dict: The PathIndex for each search path, keyed by the
+                absolute path.  Search paths that failed to scan are
+                missing.
+        """
+        self.thread.join()
+        return self.indexes
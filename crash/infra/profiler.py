@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# The profile of the current session's startup, if it has been recorded
+startup_profile = None
+
+class StartupProfiler(object):
+    """
+    Records the cost of each phase of startup
+
+    For each phase, the wall time, the reads issued to the dump file and,
+    if enabled, the Python memory allocated are recorded.  The import and
+    callback time of each module loaded by autoload_submodules can be
+    recorded as well.
+
+    Args:
+        read_source (callable, optional): Returns a dictionary with the
+            current 'reads', 'bytes' and 'time' counters of the dump file,
+            or None if there is no dump file yet
+        trace_allocations (bool, optional, default=False): Whether to
+            trace Python allocations with tracemalloc.  This slows startup
+            down noticeably and is ignored if tracemalloc is unavailable.
+    """
+    def __init__(self, read_source=None, trace_allocations=False):
+        self.read_source = read_source
+        self.tracing = trace_allocations and tracemalloc is not None
+        self.started_tracing = False
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.metadata = {}
+        self.phases = []
+        self.modules = []
+        self.start = time.time()
+
+    def read_counters(self):
+        counters = None
+        if self.read_source is not None:
+            counters = self.read_source()
+        if counters is None:
+            return (0, 0, 0.0)
+        return (counters['reads'], counters['bytes'], counters['time'])
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Records a phase of startup as a with statement context
+
+        Args:
+            name (str): The name to report the phase under
+        """
+        reads = self.read_counters()
+        if self.tracing:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            after = self.read_counters()
+            phase = {
+                'name' : name,
+                'time' : elapsed,
+                'reads' : after[0] - reads[0],
+                'read_bytes' : after[1] - reads[1],
+                'read_time' : after[2] - reads[2],
+            }
+            if self.tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                phase['allocated'] = current - allocated
+                phase['peak'] = peak
+            self.phases.append(phase)
+
+    def record_module(self, name, import_time, callback_time=0.0):
+        """
+        Records the cost of loading one module
+
+        Args:
+            name (str): The name of the module
+            import_time (float): Seconds spent importing the module
+            callback_time (float, optional): Seconds spent in the
+                autoload callback for the module
+        """
+        self.modules.append({
+            'name' : name,
+            'import_time' : import_time,
+            'callback_time' : callback_time,
+        })
+
+    def finish(self):
+        self.total = time.time() - self.start
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def to_dict(self):
+        return {
+            'metadata' : self.metadata,
+            'total' : getattr(self, 'total', time.time() - self.start),
+            'phases' : self.phases,
+            'modules' : self.modules,
+        }
+
+    def save(self, filename):
+        """
+        Writes the profile to a file as JSON
+
+        Args:
+            filename (str): The path to write to
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    def report(self, modules=10, out=sys.stdout):
+        """
+        Prints a breakdown of the startup time
+
+        Args:
+            modules (int, optional, default=10): The number of the most
+                expensive modules to list
+            out (file, optional, default=sys.stdout): Where to print
+        """
+        profile = self.to_dict()
+        print("Startup: {:.3f}s".format(profile['total']), file=out)
+        print("  {:<28s} {:>9s} {:>8s} {:>12s}"
+              .format("PHASE", "TIME", "READS", "BYTES"), end='', file=out)
+        if self.tracing:
+            print(" {:>12s}".format("ALLOCATED"), end='', file=out)
+        print(file=out)
+        for phase in self.phases:
+            print("  {:<28s} {:>8.3f}s {:>8d} {:>12d}"
+                  .format(phase['name'], phase['time'], phase['reads'],
+                          phase['read_bytes']), end='', file=out)
+            if 'allocated' in phase:
+                print(" {:>12d}".format(phase['allocated']), end='',
+                      file=out)
+            print(file=out)
+
+        if not self.modules or not modules:
+            return
+
+        costly = sorted(self.modules, reverse=True,
+                        key=lambda m: m['import_time'] + m['callback_time'])
+        print("Slowest modules:", file=out)
+        for mod in costly[:modules]:
+            print("  {:<40s} {:>8.3f}s (import {:.3f}s, callback {:.3f}s)"
+                  .format(mod['name'],
+                          mod['import_time'] + mod['callback_time'],
+                          mod['import_time'], mod['callback_time']),
+                  file=out)
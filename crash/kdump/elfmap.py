@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import mmap
+from bisect import bisect_right
+from elftools.elf.elffile import ELFFile
+
+class NotElfVmcoreError(ValueError):
+    """The file is not an uncompressed ELF core dump."""
+    pass
+
+class ElfVmcoreMap(object):
+    """
+    A read-only memory mapping of an uncompressed ELF vmcore
+
+    The PT_LOAD program headers describe where each range of physical
+    memory lives in the file.  Once mapped, physical memory can be
+    accessed as slices of the mapping without going through libkdumpfile.
+
+    Args:
+        filename (str): The path to the vmcore
+
+    Raises:
+        NotElfVmcoreError: The file is not an ELF core file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        try:
+            self.load_segments()
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except Exception:
+            self.file.close()
+            raise
+
+        try:
+            self.view = memoryview(self.map)
+        except TypeError:
+            # Python 2 mmap objects don't export the buffer interface
+            self.view = self.map
+
+        self.reads = 0
+        self.bytes_read = 0
+
+    def load_segments(self):
+        if self.file.read(4) != b'\x7fELF':
+            raise NotElfVmcoreError("{} is not an ELF file"
+                                    .format(self.filename))
+        self.file.seek(0)
+
+        elf = ELFFile(self.file)
+        if elf['e_type'] != 'ET_CORE':
+            raise NotElfVmcoreError("{} is not an ELF core file"
+                                    .format(self.filename))
+
+        segments = []
+        for segment in elf.iter_segments():
+            if segment['p_type'] != 'PT_LOAD' or segment['p_filesz'] == 0:
+                continue
+            segments.append((segment['p_paddr'],
+                             segment['p_paddr'] + segment['p_filesz'],
+                             segment['p_offset']))
+
+        if not segments:
+            raise NotElfVmcoreError("{} has no PT_LOAD segments"
+                                    .format(self.filename))
+
+        segments.sort()
+        self.segments = segments
+        self.starts = [seg[0] for seg in segments]
+
+    def close(self):
+        self.view = None
+        self.map.close()
+        self.file.close()
+
+    def read(self, paddr, length):
+        """
+        Returns a slice of the mapping for a physical address range
+
+        Args:
+            paddr (int): The physical address to start at
+            length (int): The number of bytes to return
+
+        Returns:
+            memoryview: The requested range, without copying, or
+            None: if the range is not entirely contained in one
+                PT_LOAD segment
+        """
+        idx = bisect_right(self.starts, paddr) - 1
+        if idx < 0:
+            return None
+
+        start, end, offset = self.segments[idx]
+        if paddr + length > end:
+            return None
+
+        self.reads += 1
+        self.bytes_read += length
+        offset += paddr - start
+        return self.view[offset:offset + length]
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import time
+from collections import OrderedDict
+
+# 64 MiB worth of pages unless the caller asks otherwise
+DEFAULT_CACHE_SIZE = 64 << 20
+
+# Read-ahead window bounds, in pages
+READAHEAD_MIN = 4
+READAHEAD_MAX = 64
+
+# Number of consecutive sequential misses before read-ahead kicks in
+READAHEAD_TRIGGER = 2
+
+# Coalesced ranges will not grow beyond this size
+MAX_SPAN = 4 << 20
+
+def coalesce_ranges(ranges, page_size, max_span=MAX_SPAN):
+    """
+    Groups memory ranges into page-aligned spans that can each be read
+    with a single call
+
+    Ranges that share or touch a page are merged into the same span as
+    long as the span stays below max_span bytes.
+
+    Args:
+        ranges (list of (int, int)): The (address, length) pairs to group
+        page_size (int): The page size to align spans to
+        max_span (int, optional, default=MAX_SPAN): The largest span to
+            create by merging.  A single range larger than this is
+            still returned as one span.
+
+    Returns:
+        list of (int, int, list of int): Each span as (start, end, indices)
+            where indices refers to the positions of the ranges it covers
+            in the original list.  Spans are sorted by address.
+    """
+    mask = page_size - 1
+    order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+
+    spans = []
+    for idx in order:
+        addr, length = ranges[idx]
+        if length <= 0:
+            continue
+        start = addr & ~mask
+        end = (addr + length + mask) & ~mask
+        if spans:
+            span = spans[-1]
+            if start <= span[1] and max(end, span[1]) - span[0] <= max_span:
+                span[1] = max(end, span[1])
+                span[2].append(idx)
+                continue
+        spans.append([start, end, [idx]])
+
+    return [tuple(span) for span in spans]
+
+class PageCache(object):
+    """
+    A page-granular LRU cache for memory reads
+
+    Most accesses made through gdb are small reads of individual structure
+    members that hit the same handful of pages over and over.  The cache
+    reads whole pages from the backing reader and serves sub-page reads
+    out of the cached copies.
+
+    Args:
+        reader (callable): Called as reader(addr, length) to read a
+            page-aligned range.  It must return a bytes-like object of
+            the requested length or raise an exception.
+        page_size (int): The size of a page.  Must be a power of two.
+        max_bytes (int, optional, default=DEFAULT_CACHE_SIZE): The memory
+            budget for cached pages.
+        negative_errors (tuple of exception types, optional): Errors
+            raised by the reader that mean the page will never be
+            readable.  Pages that fail with one of these are remembered
+            and later reads fail immediately with the same exception until
+            invalidate_negative() is called.
+        readahead (bool, optional, default=False): Whether to detect
+            sequential access and read the following pages in a single
+            call to the reader.
+    """
+    def __init__(self, reader, page_size, max_bytes=DEFAULT_CACHE_SIZE,
+                 negative_errors=(), readahead=False):
+        if page_size <= 0 or page_size & (page_size - 1):
+            raise ValueError("page_size must be a power of two")
+
+        self.reader = reader
+        self.page_size = page_size
+        self.page_shift = page_size.bit_length() - 1
+        self.page_mask = page_size - 1
+        self.pages = OrderedDict()
+        self.negative_errors = negative_errors
+        self.unavailable = {}
+        self.readahead = readahead
+        self.prefetched = set()
+        self.ra_next = None
+        self.ra_run = 0
+        self.ra_window = READAHEAD_MIN
+        self.resize(max_bytes)
+        self.reset_stats()
+
+    def resize(self, max_bytes):
+        """
+        Changes the memory budget of the cache, evicting pages as needed
+
+        Args:
+            max_bytes (int): The new memory budget in bytes.  A budget
+                of 0 disables caching.
+        """
+        self.max_bytes = max_bytes
+        self.max_pages = max_bytes // self.page_size
+        while len(self.pages) > self.max_pages:
+            self.evict()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+        self.negative_hits = 0
+        self.negative_misses = 0
+        self.negative_time = 0.0
+        self.readahead_issued = 0
+        self.readahead_pages = 0
+        self.readahead_hits = 0
+        self.readahead_wasted = 0
+
+    def negative_time_saved(self):
+        """
+        Estimates the time saved by the negative cache
+
+        Returns:
+            float: The number of seconds that the failed reads answered by
+                the negative cache would have taken, based on the average
+                cost of the failed reads that populated it
+        """
+        if self.negative_misses == 0:
+            return 0.0
+        return self.negative_hits * self.negative_time / self.negative_misses
+
+    def stats(self):
+        return {
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'evictions' : self.evictions,
+            'bypassed' : self.bypassed,
+            'pages' : len(self.pages),
+            'max_pages' : self.max_pages,
+            'negative_hits' : self.negative_hits,
+            'negative_misses' : self.negative_misses,
+            'negative_pages' : len(self.unavailable),
+            'negative_time_saved' : self.negative_time_saved(),
+            'readahead_issued' : self.readahead_issued,
+            'readahead_pages' : self.readahead_pages,
+            'readahead_hits' : self.readahead_hits,
+            'readahead_wasted' : self.readahead_wasted,
+        }
+
+    def flush(self):
+        self.pages.clear()
+        self.unavailable.clear()
+        self.prefetched.clear()
+        self.ra_next = None
+        self.ra_run = 0
+        self.ra_window = READAHEAD_MIN
+
+    def invalidate_negative(self):
+        """
+        Forgets which pages are unavailable
+
+        This must be called whenever the address translation setup changes
+        since a page that could not be translated before may be
+        translatable now.
+        """
+        self.unavailable.clear()
+
+    def evict(self):
+        pfn, data = self.pages.popitem(last=False)
+        if pfn in self.prefetched:
+            self.prefetched.remove(pfn)
+            self.readahead_wasted += 1
+
+    def insert(self, pfn, data):
+        if self.max_pages == 0:
+            return
+        if pfn in self.pages:
+            del self.pages[pfn]
+        elif len(self.pages) >= self.max_pages:
+            self.evict()
+            self.evictions += 1
+        self.pages[pfn] = data
+
+    def lookup(self, pfn):
+        try:
+            data = self.pages.pop(pfn)
+        except KeyError:
+            return None
+
+        # Reinserting moves the page to the most recently used position
+        self.pages[pfn] = data
+        return data
+
+    def get_page(self, pfn):
+        data = self.lookup(pfn)
+        if data is not None:
+            self.hits += 1
+            if self.prefetched and pfn in self.prefetched:
+                self.prefetched.remove(pfn)
+                self.readahead_hits += 1
+            return data
+
+        self.check_unavailable(pfn)
+
+        self.misses += 1
+        if self.readahead:
+            data = self.read_ahead(pfn)
+            if data is not None:
+                return data
+
+        data = self.read_page(pfn)
+        self.insert(pfn, data)
+        return data
+
+    def check_unavailable(self, pfn):
+        error = self.unavailable.get(pfn)
+        if error is not None:
+            self.negative_hits += 1
+            # A fresh exception keeps tracebacks from piling up on one object
+            raise error[0](*error[1])
+
+    def read_page(self, pfn):
+        """
+        Reads a page from the reader, remembering it if it is unavailable
+        """
+        start = time.time()
+        try:
+            return self.reader(pfn << self.page_shift, self.page_size)
+        except self.negative_errors as e:
+            self.negative_misses += 1
+            self.negative_time += time.time() - start
+            self.unavailable[pfn] = (e.__class__, e.args)
+            raise
+
+    def first_unavailable(self, first, last):
+        """
+        Returns the first page from first to last that is known to be
+        unavailable, or None
+        """
+        if not self.unavailable:
+            return None
+        if len(self.unavailable) < last - first + 1:
+            bad = [ pfn for pfn in self.unavailable if first <= pfn <= last ]
+            return min(bad) if bad else None
+        for pfn in range(first, last + 1):
+            if pfn in self.unavailable:
+                return pfn
+        return None
+
+    def read_uncached(self, addr, length):
+        """
+        Reads a large range straight from the reader
+
+        The read stops short of any page already known to be
+        unavailable.  If the read fails, the range is read a page at a
+        time to find and remember the page that failed, and the data
+        before it is returned.
+        """
+        first = addr >> self.page_shift
+        last = (addr + length - 1) >> self.page_shift
+
+        bad = self.first_unavailable(first, last)
+        if bad is not None:
+            self.check_unavailable(first)
+            length = (bad << self.page_shift) - addr
+
+        try:
+            return self.reader(addr, length)
+        except self.negative_errors:
+            pass
+
+        offset = addr & self.page_mask
+        buf = bytearray()
+        last = (addr + length - 1) >> self.page_shift
+        for pfn in range(first, last + 1):
+            try:
+                data = self.read_page(pfn)
+            except self.negative_errors:
+                if pfn == first:
+                    raise
+                break
+            buf += data
+        return buf[offset:offset + length]
+
+    def readahead_count(self, pfn):
+        """
+        Returns the number of pages to read starting at a missed page
+
+        Sequential misses grow the window up to READAHEAD_MAX pages.  Any
+        miss that doesn't follow the previous one resets it, which turns
+        read-ahead off for random access patterns.
+        """
+        if pfn == self.ra_next:
+            self.ra_run += 1
+        else:
+            self.ra_run = 0
+            self.ra_window = READAHEAD_MIN
+        self.ra_next = pfn + 1
+
+        if self.ra_run < READAHEAD_TRIGGER:
+            return 1
+
+        count = min(self.ra_window, self.max_pages // 4)
+        self.ra_window = min(self.ra_window * 2, READAHEAD_MAX)
+
+        # Don't reread pages we already have or know we can't read
+        for n in range(1, count):
+            if pfn + n in self.pages or pfn + n in self.unavailable:
+                return n
+        return count
+
+    def read_ahead(self, pfn):
+        count = self.readahead_count(pfn)
+        if count <= 1:
+            return None
+
+        try:
+            data = self.reader(pfn << self.page_shift,
+                               count << self.page_shift)
+        except Exception:
+            # Let the single page read sort out which page failed
+            self.ra_window = READAHEAD_MIN
+            return None
+
+        self.readahead_issued += 1
+        self.readahead_pages += count - 1
+        self.ra_next = pfn + count
+
+        size = self.page_size
+        for n in range(count):
+            self.insert(pfn + n, bytes(data[n * size:(n + 1) * size]))
+            if n:
+                self.prefetched.add(pfn + n)
+
+        return self.lookup(pfn)
+
+    def read(self, addr, length):
+        """
+        Reads a range of memory through the cache
+
+        If a page other than the first cannot be read, the data read up
+        to that point is returned.  Errors reading the first page are
+        raised to the caller.
+
+        Args:
+            addr (int): The address to start reading at
+            length (int): The number of bytes to read
+
+        Returns:
+            bytes-like object: The data read, which may be shorter than
+                requested
+        """
+        first = addr >> self.page_shift
+        last = (addr + length - 1) >> self.page_shift
+        offset = addr & self.page_mask
+
+        # Large reads would just flush the cache and wouldn't be
+        # reused anyway.
+        if last - first >= self.max_pages // 4:
+            self.bypassed += 1
+            return self.read_uncached(addr, length)
+
+        if first == last:
+            return self.get_page(first)[offset:offset + length]
+
+        buf = bytearray()
+        for pfn in range(first, last + 1):
+            try:
+                data = self.get_page(pfn)
+            except Exception:
+                if pfn == first:
+                    raise
+                break
+            buf += data
+        return buf[offset:offset + length]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+def size_bucket(length):
+    """
+    Returns the histogram bucket for a read size
+
+    Buckets are powers of two.  A read falls into the smallest bucket
+    that is at least as large as the read.
+    """
+    if length <= 1:
+        return 1
+    return 1 << (length - 1).bit_length()
+
+def diff_counters(new, old):
+    """
+    Subtracts one nested dictionary of counters from another
+
+    Keys missing from old are treated as zero.  Non-numeric values are
+    taken from new.
+    """
+    out = {}
+    for key, value in new.items():
+        prev = old.get(key)
+        if isinstance(value, dict):
+            out[key] = diff_counters(value, prev or {})
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[key] = value - (prev or 0)
+        else:
+            out[key] = value
+    return out
+
+def add_counters(total, delta):
+    """Adds a nested dictionary of counters into another, in place"""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            add_counters(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+        else:
+            total[key] = value
+    return total
+
+class ReadStats(object):
+    """
+    Counters for reads issued to the dump file
+
+    Attributes:
+        reads (int): The number of reads
+        bytes (int): The number of bytes requested
+        time (float): The time spent in the reads, in seconds
+        sizes (dict): Read count by size bucket (see size_bucket)
+        errors (dict): Failed read count by exception type name
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.reads = 0
+        self.bytes = 0
+        self.time = 0.0
+        self.sizes = {}
+        self.errors = {}
+
+    def record(self, length, elapsed, error=None):
+        self.reads += 1
+        self.bytes += length
+        self.time += elapsed
+
+        bucket = size_bucket(length)
+        self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+
+        if error is not None:
+            name = error.__class__.__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def snapshot(self):
+        return {
+            'reads' : self.reads,
+            'bytes' : self.bytes,
+            'time' : self.time,
+            'sizes' : dict(self.sizes),
+            'errors' : dict(self.errors),
+        }
+
+class CommandStats(object):
+    """
+    Attributes counter changes to the commands that caused them
+
+    Args:
+        source (callable): Returns a nested dictionary of the current
+            counter values
+    """
+    def __init__(self, source):
+        self.source = source
+        self.pending = []
+        self.reset()
+
+    def reset(self):
+        self.commands = {}
+
+    def rebase(self):
+        """Restarts the commands in progress after the counters are reset"""
+        current = self.source()
+        self.pending = [ (name, current) for name, before in self.pending ]
+
+    def begin(self, name):
+        self.pending.append((name, self.source()))
+
+    def end(self):
+        name, before = self.pending.pop()
+        delta = diff_counters(self.source(), before)
+        delta['invocations'] = 1
+
+        # Nested commands are accounted to the outer command as well
+        add_counters(self.commands.setdefault(name, {}), delta)
@@ -7,11 +7,18 @@ from __future__ import division
 
 import gdb
 import sys
-from kdumpfile import kdumpfile, KDUMP_KVADDR
+import time
+from kdumpfile import kdumpfile, KDUMP_KVADDR, KDUMP_MACHPHYSADDR
 from kdumpfile.exceptions import *
 import addrxlat
 import crash.arch
 import crash.arch.x86_64
+from crash.kdump.pagecache import PageCache, DEFAULT_CACHE_SIZE
+from crash.kdump.pagecache import coalesce_ranges
+from crash.kdump.elfmap import ElfVmcoreMap, NotElfVmcoreError
+from elftools.common.exceptions import ELFError
+from crash.addrxlat import TranslationCache
+from crash.kdump.stats import ReadStats, CommandStats
 
 if sys.version_info.major >= 3:
     long = int
@@ -37,7 +44,19 @@ class SymbolCallback(object):
         raise addrxlat.NoDataError()
 
 class Target(gdb.Target):
-    def __init__(self, vmcore, debug=False):
+    """
+    A gdb target that reads memory from a kdumpfile
+
+    Args:
+        vmcore (kdumpfile): The opened dump file
+        debug (bool, optional, default=False): Whether to report read errors
+        cache_size (int, optional, default=DEFAULT_CACHE_SIZE): The memory
+            budget for the page cache in bytes.  0 disables the cache.
+        readahead (bool, optional, default=True): Whether to prefetch
+            the following pages when reads walk sequentially through memory
+    """
+    def __init__(self, vmcore, debug=False, cache_size=DEFAULT_CACHE_SIZE,
+                 readahead=True):
         if not isinstance(vmcore, kdumpfile):
             raise TypeError("vmcore must be of type kdumpfile")
         self.arch = None
@@ -45,8 +64,24 @@ class Target(gdb.Target):
         self.kdump = vmcore
         ctx = self.kdump.get_addrxlat_ctx()
         ctx.cb_sym = SymbolCallback(ctx)
+        self.xlat_context = ctx
+        self.elf_map = None
         self.kdump.attr['addrxlat.ostype'] = 'linux'
 
+        page_size = self.kdump.attr.get('arch.page_size', 4096)
+        self.xlat_system = self.kdump.get_addrxlat_sys()
+        self.tlb = TranslationCache(ctx, self.xlat_system,
+                                    page_size.bit_length() - 1)
+        self.page_cache = PageCache(self.read_pages, page_size, cache_size,
+                                    (NoDataException,
+                                     AddressTranslationException),
+                                    readahead)
+        self.read_stats = ReadStats()
+        self.command_stats = CommandStats(self.stats)
+
+        # Loading symbols can change how addresses are translated
+        gdb.events.new_objfile.connect(self.translation_changed)
+
         # So far we've read from the kernel image, now that we've setup
         # the architecture, we're ready to plumb into the target
         # infrastructure.
@@ -69,6 +104,175 @@ class Target(gdb.Target):
                             .format(archname, archclass.ident))
 
         self.arch = archclass()
+        self.translation_changed()
+
+    def translation_changed(self, event=None):
+        """
+        Drops cached translations and knowledge about untranslatable
+        addresses
+
+        Args:
+            event (gdb.NewObjFileEvent, optional): The event that triggered
+                the call, if called as an event handler
+        """
+        self.page_cache.invalidate_negative()
+        self.tlb.flush()
+
+    def map_elf_vmcore(self, filename):
+        """
+        Maps an uncompressed ELF vmcore for direct access
+
+        Reads that can be translated to a physical address contained
+        in one of the PT_LOAD segments will be served directly from the
+        mapping instead of through libkdumpfile and the page cache.
+
+        Args:
+            filename (str): The path to the vmcore that was opened
+
+        Returns:
+            bool: Whether the file could be mapped
+        """
+        try:
+            self.elf_map = ElfVmcoreMap(filename)
+        except (NotElfVmcoreError, ELFError, EnvironmentError) as e:
+            if self.debug:
+                print("Not mapping {}: {}".format(filename, str(e)),
+                      file=sys.stderr)
+            self.elf_map = None
+            return False
+
+        return True
+
+    def translate(self, addr):
+        return self.tlb.translate(addr, addrxlat.MACHPHYSADDR)
+
+    def read_mapped(self, addr, length, readbuf):
+        """
+        Copies as much of a range as possible from the ELF mapping
+
+        Args:
+            addr (int): The kernel virtual address to start reading at
+            length (int): The number of bytes to read
+            readbuf (buffer): The buffer to copy into
+
+        Returns:
+            int: The number of bytes copied from the start of the range
+        """
+        page_size = self.page_cache.page_size
+        done = 0
+        while done < length:
+            vaddr = addr + done
+            count = min(length - done, page_size - (vaddr & (page_size - 1)))
+            try:
+                paddr = self.translate(vaddr)
+            except addrxlat.BaseException:
+                break
+            data = self.elf_map.read(paddr, count)
+            if data is None:
+                break
+            readbuf[done:done + count] = data
+            done += count
+        return done
+
+    def stats(self):
+        """
+        Returns the I/O counters for the session
+
+        Returns:
+            dict: The counters, grouped by the component that keeps them
+        """
+        stats = {
+            'kdump' : self.read_stats.snapshot(),
+            'page_cache' : self.page_cache.stats(),
+            'tlb' : self.tlb.stats(),
+        }
+        if self.elf_map is not None:
+            stats['elf_map'] = {
+                'reads' : self.elf_map.reads,
+                'bytes' : self.elf_map.bytes_read,
+            }
+        return stats
+
+    def reset_stats(self):
+        self.read_stats.reset()
+        self.page_cache.reset_stats()
+        self.tlb.reset_stats()
+        if self.elf_map is not None:
+            self.elf_map.reads = 0
+            self.elf_map.bytes_read = 0
+        self.command_stats.reset()
+        self.command_stats.rebase()
+
+    def kdump_read(self, addrspace, addr, length):
+        start = time.time()
+        try:
+            data = self.kdump.read(addrspace, addr, length)
+        except Exception as e:
+            self.read_stats.record(length, time.time() - start, e)
+            raise
+        self.read_stats.record(length, time.time() - start)
+        return data
+
+    def read_pages(self, addr, length):
+        page_size = self.page_cache.page_size
+        if length > page_size or addr & (page_size - 1):
+            return self.kdump_read(KDUMP_KVADDR, addr, length)
+
+        # Single pages are translated through our own TLB so that
+        # libkdumpfile doesn't walk the page tables for every page.
+        # If we can't translate it, let libkdumpfile try and report
+        # the error.
+        try:
+            paddr = self.translate(addr)
+        except addrxlat.BaseException:
+            return self.kdump_read(KDUMP_KVADDR, addr, length)
+        return self.kdump_read(KDUMP_MACHPHYSADDR, paddr, length)
+
+    def read_many(self, ranges):
+        """
+        Reads many ranges of kernel virtual memory at once
+
+        The ranges are sorted and coalesced by page so that neighboring
+        ranges are read with a single libkdumpfile call.  The results
+        are views into the buffers that were read and are not copied.
+
+        Args:
+            ranges (list of (int, int)): The (address, length) pairs to read
+
+        Returns:
+            list of memoryview: The contents of each range, in the order
+                requested.  Ranges that could not be read are None.
+        """
+        results = [None] * len(ranges)
+        page_size = self.page_cache.page_size
+
+        for start, end, members in coalesce_ranges(ranges, page_size):
+            try:
+                buf = memoryview(self.kdump_read(KDUMP_KVADDR, start,
+                                                 end - start))
+            except (EOFException, NoDataException,
+                    AddressTranslationException) as e:
+                if self.debug:
+                    self.report_error(start, end - start, e)
+                buf = None
+
+            for idx in members:
+                addr, length = ranges[idx]
+                if buf is not None:
+                    results[idx] = buf[addr - start:addr - start + length]
+                    continue
+
+                # Some page in the span is unreadable; find out which
+                # of the ranges are still intact.
+                try:
+                    data = self.page_cache.read(addr, length)
+                except (EOFException, NoDataException,
+                        AddressTranslationException):
+                    continue
+                if len(data) == length:
+                    results[idx] = memoryview(data)
+
+        return results
 
     @classmethod
     def report_error(cls, addr, length, error):
@@ -79,26 +283,31 @@ class Target(gdb.Target):
     def to_xfer_partial(self, obj, annex, readbuf, writebuf, offset, ln):
         ret = -1
         if obj == self.TARGET_OBJECT_MEMORY:
+            done = 0
+            if self.elf_map is not None:
+                done = self.read_mapped(offset, ln, readbuf)
+                if done == ln:
+                    return ln
             try:
-                r = self.kdump.read(KDUMP_KVADDR, offset, ln)
-                readbuf[:] = r
-                ret = ln
-            except EOFException as e:
-                if self.debug:
-                    self.report_error(offset, ln, e)
-                raise gdb.TargetXferEof(str(e))
-            except NoDataException as e:
-                if self.debug:
-                    self.report_error(offset, ln, e)
-                raise gdb.TargetXferUnavailable(str(e))
-            except AddressTranslationException as e:
-                if self.debug:
-                    self.report_error(offset, ln, e)
-                raise gdb.TargetXferUnavailable(str(e))
+                r = self.page_cache.read(offset + done, ln - done)
+                ret = done + len(r)
+                readbuf[done:ret] = r
+            except (EOFException, NoDataException,
+                    AddressTranslationException) as e:
+                if done:
+                    return done
+                self.raise_xfer_error(offset, ln, e)
         else:
             raise IOError("Unknown obj type")
         return ret
 
+    def raise_xfer_error(self, offset, ln, error):
+        if self.debug:
+            self.report_error(offset, ln, error)
+        if isinstance(error, EOFException):
+            raise gdb.TargetXferEof(str(error))
+        raise gdb.TargetXferUnavailable(str(error))
+
     @staticmethod
     def to_thread_alive(ptid):
         return True
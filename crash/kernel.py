@@ -8,22 +8,77 @@ from __future__ import division
 import gdb
 import sys
 import os.path
-from crash.infra import CrashBaseClass, export
-from crash.types.list import list_for_each_entry
+import struct
+import binascii
+from bisect import bisect_right
+from crash.infra import CrashBaseClass, export, register_singleton
+from crash.infra.pathindex import PathIndex, SearchPathScanner
+from crash.util import offsetof, read_many, read_fields, lookup_fallbacks
+from crash.util import TypesUtilClass
+from crash.types.list import list_for_each_entry, list_for_each_raw
 from crash.types.percpu import get_percpu_var
-from crash.types.list import list_for_each_entry
+from crash.types.stack import search_stacks_for_ranges
 import crash.cache.tasks
 from crash.types.task import LinuxTask
 import crash.kdump
 import crash.kdump.target
 from kdumpfile import kdumpfile
 from elftools.elf.elffile import ELFFile
+from elftools.common.exceptions import ELFError
 
 if sys.version_info.major >= 3:
     long = int
 
 LINUX_KERNEL_PID = 1
 
+# The longest symbol name the kernel will record
+KSYM_NAME_LEN = 128
+
+def read_build_id(elffile):
+    """
+    Reads the GNU build-id note from an ELF file
+
+    Args:
+        elffile (ELFFile): The file to read
+
+    Returns:
+        str: The build-id as a hex string, or None if the file has none
+    """
+    section = elffile.get_section_by_name('.note.gnu.build-id')
+    if section is None:
+        return None
+    for note in section.iter_notes():
+        if note['n_type'] != 'NT_GNU_BUILD_ID':
+            continue
+        desc = note['n_desc']
+        # Older pyelftools return the raw descriptor
+        if isinstance(desc, bytes):
+            desc = binascii.hexlify(desc).decode('ascii')
+        return desc
+    return None
+
+class ModuleInfo(object):
+    """
+    The layout of a loaded module, recorded before its symbols are loaded
+
+    Attributes:
+        name (str): The name of the module
+        address (long): The address of the struct module
+        base (long): The start of the module's core section
+        size (long): The size of the module's core section
+        sections (str): The section arguments for add-symbol-file
+        loaded (bool): Whether loading the symbols has been attempted
+        path (str): The path to the module file, if it was found
+    """
+    def __init__(self, name, address, base, size, sections):
+        self.name = name
+        self.address = address
+        self.base = base
+        self.size = size
+        self.sections = sections
+        self.loaded = False
+        self.path = None
+
 class CrashKernel(CrashBaseClass):
     __types__ = [ 'struct module' ]
     __symvals__ = [ 'modules' ]
@@ -32,12 +87,23 @@ class CrashKernel(CrashBaseClass):
         self.findmap = {}
         self.vmlinux_filename = vmlinux_filename
         self.searchpath = searchpath
+        self.path_scanner = None
+        if searchpath:
+            # Index the search paths while the vmcore and kernel are opened
+            self.path_scanner = SearchPathScanner(searchpath)
+        self.module_info = []
+        self.module_bases = []
+        self.module_by_name = {}
+        self.module_symbols = None
 
         f = open(self.vmlinux_filename, 'rb')
         self.elffile = ELFFile(f)
 
         self.set_gdb_arch()
 
+        # Route the exported module loading functions to this kernel
+        register_singleton(sys.modules[__name__], self)
+
     def set_gdb_arch(self):
         mach = self.elffile['e_machine']
         e_class = self.elffile['e_ident']['EI_CLASS']
@@ -72,6 +138,11 @@ class CrashKernel(CrashBaseClass):
 
         self.target.setup_arch()
 
+        try:
+            self.thread_size = gdb.lookup_type('union thread_union').sizeof
+        except gdb.error:
+            self.thread_size = 16384
+
     def get_sections(self):
         sections = {}
 
@@ -111,6 +182,7 @@ class CrashKernel(CrashBaseClass):
         self.vmcore_filename = vmcore_filename
         self.vmcore = kdumpfile(vmcore_filename)
         self.target = crash.kdump.target.Target(self.vmcore, debug)
+        self.target.map_elf_vmcore(vmcore_filename)
 
         self.base_offset = 0
         try:
@@ -137,46 +209,120 @@ class CrashKernel(CrashBaseClass):
 
         return " ".join(out)
 
-    def load_modules(self, verbose=False):
+    def module_core_range(self, module):
+        if 'module_core' in module.type:
+            return (long(module['module_core']), long(module['core_size']))
+        layout = module['core_layout']
+        return (long(layout['base']), long(layout['size']))
+
+    def collect_modules(self):
+        """
+        Records the name, address range and section layout of every
+        loaded module without loading any symbols
+        """
+        self.module_info = []
+        self.module_by_name = {}
+        self.module_symbols = None
+        self.searched_pids = set()
+
+        for module in self.for_each_module():
+            base, size = self.module_core_range(module)
+            info = ModuleInfo(module['name'].string(), long(module.address),
+                              base, size, self.get_module_sections(module))
+            self.module_info.append(info)
+            self.module_by_name[info.name] = info
+
+        self.module_info.sort(key=lambda info: info.base)
+        self.module_bases = [info.base for info in self.module_info]
+        self.pending_modules = len(self.module_info)
+
+    def load_module(self, info, verbose=False):
+        """
+        Loads the symbols and debuginfo for a module
+
+        Args:
+            info (ModuleInfo): The module to load
+            verbose (bool, optional, default=False): Whether to report
+                where the module is loaded
+
+        Returns:
+            bool: Whether the module file could be found
+        """
+        if info.loaded:
+            return info.path is not None
+        info.loaded = True
+        self.pending_modules -= 1
+
+        modfname = "{}.ko".format(info.name)
+        for path in self.searchpath:
+            modpath = self.find_module_file(modfname, path)
+            if not modpath:
+                continue
+
+            if verbose:
+                print("Loading {} at {:#x}".format(info.name, info.base))
+            gdb.execute("add-symbol-file {} {:#x} {}"
+                        .format(modpath, info.base, info.sections),
+                        to_string=True)
+            sal = gdb.find_pc_line(info.base)
+            if sal.symtab is None:
+                objfile = gdb.lookup_objfile(modpath)
+                self.load_debuginfo(objfile, modpath)
+
+            info.path = modpath
+
+            # We really should check the version, but GDB doesn't export
+            # a way to lookup sections.
+            return True
+
+        return False
+
+    def load_modules(self, verbose=False, lazy=False):
+        """
+        Loads symbols for the kernel modules
+
+        Args:
+            verbose (bool, optional, default=False): Whether to report
+                each module as it is loaded
+            lazy (bool, optional, default=False): Only record the module
+                layout now and load each module's symbols the first time
+                an address or symbol lookup needs them.  The
+                modules on the stacks of the tasks that were running are
+                loaded immediately and those on the stack of any other
+                task once its thread is selected.
+        """
+        if lazy:
+            print("Locating modules...", end='')
+            sys.stdout.flush()
+            self.collect_modules()
+            self.load_active_task_modules()
+            print(" done. ({} modules, {} loaded, the rest on demand)"
+                  .format(len(self.module_info),
+                          len(self.module_info) - self.pending_modules))
+            if self.lookup_fallback not in lookup_fallbacks:
+                lookup_fallbacks.append(self.lookup_fallback)
+            gdb.events.before_prompt.connect(self.load_selected_task_modules)
+            return
+
+        self.collect_modules()
+        self.load_pending_modules(verbose)
+
+    @export
+    def load_pending_modules(self, verbose=False):
+        """
+        Loads the symbols for every module that hasn't been loaded yet
+        """
         print("Loading modules...", end='')
         sys.stdout.flush()
         failed = 0
         loaded = 0
-        for module in self.for_each_module():
-            modname = "{}".format(module['name'].string())
-            modfname = "{}.ko".format(modname)
-            found = False
-            for path in self.searchpath:
-                modpath = self.find_module_file(modfname, path)
-                if not modpath:
-                    continue
-
-                found = True
-
-                if 'module_core' in module.type:
-                    addr = long(module['module_core'])
-                else:
-                    addr = long(module['core_layout']['base'])
-
-                if verbose:
-                    print("Loading {} at {:#x}".format(modname, addr))
-                sections = self.get_module_sections(module)
-                gdb.execute("add-symbol-file {} {:#x} {}"
-                            .format(modpath, addr, sections),
-                            to_string=True)
-                sal = gdb.find_pc_line(addr)
-                if sal.symtab is None:
-                    objfile = gdb.lookup_objfile(modpath)
-                    self.load_debuginfo(objfile, modpath)
-
-                # We really should check the version, but GDB doesn't export
-                # a way to lookup sections.
-                break
-
-            if not found:
+        for info in self.module_info:
+            if info.loaded:
+                continue
+            if not self.load_module(info, verbose):
                 if failed == 0:
                     print()
-                print("Couldn't find module file for {}".format(modname))
+                print("Couldn't find module file for {}".format(info.name))
                 failed += 1
             else:
                 loaded += 1
@@ -189,23 +335,262 @@ class CrashKernel(CrashBaseClass):
         else:
             print(")")
 
+        if self.lookup_fallback in lookup_fallbacks:
+            lookup_fallbacks.remove(self.lookup_fallback)
+            gdb.events.before_prompt.disconnect(
+                                        self.load_selected_task_modules)
+
         # We shouldn't need this again, so why keep it around?
         del self.findmap
         self.findmap = {}
 
+    @export
+    def load_module_for_address(self, addr):
+        """
+        Loads the symbols for the module containing an address
+
+        Args:
+            addr (long): The address to resolve
+
+        Returns:
+            bool: Whether new symbols were loaded
+        """
+        idx = bisect_right(self.module_bases, addr) - 1
+        if idx < 0:
+            return False
+        info = self.module_info[idx]
+        if info.loaded or addr >= info.base + info.size:
+            return False
+        return self.load_module(info)
+
+    def build_module_symbol_index(self):
+        self.module_symbols = {}
+
+        sym_type = None
+        symtabs = []
+        for info in self.module_info:
+            module = gdb.Value(info.address).cast(self.module_type.pointer())
+            if 'kallsyms' in self.module_type:
+                kallsyms = module['kallsyms'].dereference()
+            else:
+                kallsyms = module.dereference()
+            sym_type = kallsyms['symtab'].type.target()
+            symtabs.append((info, long(kallsyms['symtab']),
+                            long(kallsyms['num_symtab']),
+                            long(kallsyms['strtab'])))
+
+        if sym_type is None:
+            return
+
+        u32 = struct.Struct(TypesUtilClass.target_byte_order() + 'I')
+        name_offset = offsetof(sym_type, 'st_name')
+
+        ranges = [(symtab, num * sym_type.sizeof)
+                  for (info, symtab, num, strtab) in symtabs]
+        names = []
+        for (info, symtab, num, strtab), buf in zip(symtabs,
+                                                    read_many(ranges)):
+            offsets = []
+            if buf is not None:
+                for n in range(num):
+                    pos = n * sym_type.sizeof + name_offset
+                    offsets.append(u32.unpack_from(buf, pos)[0])
+            names.append(offsets)
+
+        # The string tables aren't sized, but the last name ends
+        # shortly after the largest offset.
+        ranges = [(strtab, max(offsets or [0]) + KSYM_NAME_LEN)
+                  for (info, symtab, num, strtab), offsets
+                  in zip(symtabs, names)]
+        strbufs = read_many(ranges)
+        for (info, symtab, num, strtab), offsets, buf in zip(symtabs, names,
+                                                             strbufs):
+            if buf is None:
+                continue
+            strings = buf.tobytes()
+            for offset in offsets:
+                end = strings.find(b'\0', offset)
+                name = strings[offset:end].decode('ascii', 'replace')
+                if name and name not in self.module_symbols:
+                    self.module_symbols[name] = info
+
+    @export
+    def load_module_for_symbol(self, name):
+        """
+        Loads the symbols for the module that defines a symbol
+
+        The module is located using the symbol tables the kernel keeps
+        for each module in memory.
+
+        Args:
+            name (str): The name of the symbol
+
+        Returns:
+            bool: Whether new symbols were loaded
+        """
+        if self.module_symbols is None:
+            self.build_module_symbol_index()
+        info = self.module_symbols.get(name)
+        if info is None or info.loaded:
+            return False
+        return self.load_module(info)
+
+    def pending_module_ranges(self):
+        return [ (info.base, info.base + info.size)
+                 for info in self.module_info if not info.loaded ]
+
+    @export
+    def load_modules_for_tasks(self, pids):
+        """
+        Loads the symbols for modules with addresses on tasks' stacks
+
+        Unwinding a task's stack needs the symbols for every module
+        it passes through.  The stacks are read in batches and every
+        word is compared against the ranges of the modules that haven't
+        been loaded yet at once, so selecting many tasks costs a few
+        large reads rather than a pass over each stack.
+
+        Args:
+            pids (list of int): The tasks whose stacks will be examined
+
+        Returns:
+            bool: Whether new symbols were loaded
+        """
+        if not getattr(self, 'pending_modules', 0):
+            return False
+
+        # A stack can't change, so once it has been searched every
+        # module on it has been loaded
+        pids = [ pid for pid in pids if pid not in self.searched_pids ]
+        if not pids:
+            return False
+        self.searched_pids.update(pids)
+
+        loaded = False
+        values = set(value for pid, stack, offset, value in
+                     search_stacks_for_ranges(self.pending_module_ranges(),
+                                              pids))
+        for value in sorted(values):
+            if self.load_module_for_address(value):
+                loaded = True
+        return loaded
+
+    @export
+    def load_modules_for_task(self, task):
+        """
+        Loads the symbols for modules with addresses on a task's stack
+
+        Args:
+            task (LinuxTask): The task whose stack will be examined
+
+        Returns:
+            bool: Whether new symbols were loaded
+        """
+        return self.load_modules_for_tasks([ task.pid ])
+
+    def load_active_task_modules(self):
+        """
+        Loads the symbols for modules on the stacks and in the registers
+        of the tasks that were running when the system crashed, so they
+        can be unwound and disassembled without selecting them first
+        """
+        table = crash.cache.tasks.task_table
+        pids = []
+        for address, cpu in self.rqscurrs.items():
+            try:
+                pids.append(table.pid_for_address(address))
+            except KeyError:
+                pass
+            regs = self.vmcore.attr.cpu[cpu].reg
+            for reg in regs:
+                self.load_module_for_address(long(regs[reg]))
+        self.load_modules_for_tasks(pids)
+
+    def load_selected_task_modules(self):
+        """
+        Loads the modules on the stack of the selected task
+
+        This runs before each prompt, so once a thread has been selected
+        with gdb's own commands, e.g. thread, the next bt or frame
+        command can resolve its module frames.
+        """
+        thread = gdb.selected_thread()
+        task = getattr(thread, 'info', None) if thread is not None else None
+        if task is not None:
+            self.load_modules_for_tasks([ task.pid ])
+
+    def lookup_fallback(self, kind, name):
+        # The kernel only records the symbols of each module, so there
+        # is no way to tell which module defines a type without loading
+        # them all.  Types from modules need pyload-modules first.
+        if kind == 'symbol':
+            return self.load_module_for_symbol(name)
+        return False
+
     def find_module_file(self, name, path):
+        if not path:
+            return None
         if not path in self.findmap:
-            self.findmap[path] = {}
+            index = None
+            if self.path_scanner is not None:
+                indexes = self.path_scanner.wait()
+                index = indexes.get(os.path.abspath(path))
+            if index is None:
+                index = PathIndex(path).update()
+            self.findmap[path] = index
+        return self.findmap[path].lookup(name)
+
+    def build_id_roots(self):
+        roots = []
+        for path in self.searchpath:
+            roots.append(path)
+            roots.append(os.path.join(path, 'usr/lib/debug'))
+        try:
+            debugdirs = gdb.parameter('debug-file-directory')
+        except RuntimeError:
+            debugdirs = None
+        if debugdirs:
+            roots += debugdirs.split(os.pathsep)
+        return roots
+
+    def objfile_build_id(self, objfile, name):
+        build_id = getattr(objfile, 'build_id', None)
+        if build_id:
+            return build_id
+
+        if name == self.vmlinux_filename:
+            return read_build_id(self.elffile)
 
-            for root, dirs, files in os.walk(path):
-                for filename in files:
-                    nname = filename.replace('-', '_')
-                    self.findmap[path][nname] = os.path.join(root, filename)
         try:
-            nname = name.replace('-', '_')
-            return self.findmap[path][nname]
-        except KeyError:
+            with open(name, 'rb') as f:
+                return read_build_id(ELFFile(f))
+        except (EnvironmentError, ELFError):
+            return None
+
+    def find_debuginfo_by_build_id(self, build_id):
+        """
+        Locates a debuginfo file using the .build-id directory layout
+
+        Distribution debuginfo packages install a link to each debuginfo
+        file at .build-id/xx/yyyy.debug where xxyyyy is the build-id of
+        the binary.  Each of the search paths, the usr/lib/debug
+        directory under them, and gdb's debug-file-directory are checked.
+
+        Args:
+            build_id (str): The build-id as a hex string
+
+        Returns:
+            str: The path to the debuginfo file, or None if not found
+        """
+        if len(build_id) < 3:
             return None
+        relpath = os.path.join('.build-id', build_id[:2],
+                               "{}.debug".format(build_id[2:]))
+        for root in self.build_id_roots():
+            filepath = os.path.join(root, relpath)
+            if os.path.exists(filepath):
+                return filepath
+        return None
 
     def load_debuginfo(self, objfile, name=None, verbose=False):
         if name is None:
@@ -215,64 +600,177 @@ class CrashKernel(CrashBaseClass):
         filename = "{}.debug".format(os.path.basename(name))
         filepath = None
 
-        # Check current directory first
-        if os.path.exists(filename):
-            filepath = filename
-        else:
-            for path in self.searchpath:
-                filepath = self.find_module_file(filename, path)
-                if filepath:
-                    break
+        # The build-id gives both a direct path and an exact version match
+        build_id = self.objfile_build_id(objfile, name)
+        if build_id:
+            filepath = self.find_debuginfo_by_build_id(build_id)
+
+        if filepath is None:
+            # Check current directory first
+            if os.path.exists(filename):
+                filepath = filename
+            else:
+                for path in self.searchpath:
+                    filepath = self.find_module_file(filename, path)
+                    if filepath:
+                        break
 
         if filepath:
+            if verbose:
+                print("Loading debuginfo for {} from {}"
+                      .format(name, filepath))
             objfile.add_separate_debug_file(filepath)
         else:
             print("Could not locate debuginfo for {}".format(name))
 
-    def setup_tasks(self):
+    def setup_task(self, task):
+        """
+        Creates the LinuxTask and gdb thread for a task and caches them
+
+        Args:
+            task (gdb.Value): The struct task_struct
+
+        Returns:
+            LinuxTask: The new task, or None if the thread couldn't be
+                created
+        """
+        cpu = None
+        regs = None
+        active = long(task.address) in self.rqscurrs
+        if active:
+            cpu = self.rqscurrs[long(task.address)]
+            regs = self.vmcore.attr.cpu[cpu].reg
+
+        ltask = LinuxTask(task, active, cpu, regs)
+        ptid = (LINUX_KERNEL_PID, task['pid'], 0)
+        try:
+            thread = gdb.selected_inferior().new_thread(ptid, ltask)
+        except gdb.error as e:
+            print("Failed to setup task @{:#x}".format(long(task.address)))
+            return None
+        thread.name = task['comm'].string()
+
+        self.target.arch.setup_thread_info(thread)
+        ltask.attach_thread(thread)
+        ltask.set_get_stack_pointer(self.target.arch.get_stack_pointer)
+
+        crash.cache.tasks.cache_task(ltask)
+        return ltask
+
+    def load_task(self, address):
+        task = gdb.Value(address).cast(self.task_struct_type.pointer())
+        ltask = self.setup_task(task.dereference())
+        if ltask is None:
+            raise KeyError("Couldn't set up task at {:#x}".format(address))
+        gdb.selected_inferior().executing = False
+        return ltask
+
+    def task_cpu_spec(self, task_type):
+        """
+        Returns the member of task_struct that holds the cpu the task last
+        ran on, or None if it is kept in the thread_info on the stack
+        """
+        if 'cpu' in task_type:
+            return 'cpu'
+        if 'thread_info' in task_type and \
+           'cpu' in task_type['thread_info'].type:
+            return 'thread_info.cpu'
+        return None
+
+    def locate_tasks(self, init_task):
+        """
+        Finds every task with raw reads and records it in the task table
+
+        The lists are walked without creating gdb.Values and the pid,
+        tgid, state, cpu, parent and name of each task are read with one
+        batched read.  On kernels that keep the thread_info on the stack,
+        the cpus are read from there with a second.
+
+        Returns:
+            list of long: The task_struct address of each task located
+        """
+        task_type = init_task.type
+        tasks_offset = offsetof(task_type, 'tasks')
+        group_offset = offsetof(task_type, 'thread_group')
+
+        addresses = []
+        for node in list_for_each_raw(init_task['tasks']):
+            leader = node - tasks_offset
+            addresses.append(leader)
+            for thread in list_for_each_raw(leader + group_offset):
+                addresses.append(thread - group_offset)
+
+        # Newer kernels renamed state to __state
+        state_field = 'state' if 'state' in task_type else '__state'
+        cpu_spec = self.task_cpu_spec(task_type)
+        fields = read_fields(addresses, task_type,
+                             [ 'pid', 'tgid', state_field, 'exit_state',
+                               'parent', 'comm', cpu_spec or 'stack' ])
+        if cpu_spec is None:
+            thread_info_type = gdb.lookup_type('struct thread_info')
+            cpus = read_fields([ values[-1] or 0 for values in fields ],
+                               thread_info_type, [ 'cpu' ])
+            fields = [ values[:-1] + cpu
+                       for values, cpu in zip(fields, cpus) ]
+
+        table = crash.cache.tasks.task_table
+        state_mask = (1 << (table.state.itemsize * 8)) - 1
+        located = []
+        for address, values in zip(addresses, fields):
+            pid, tgid, state, exit_state, parent, comm, cpu = values
+            if pid is None or tgid is None:
+                print("Failed to read task @{:#x}".format(address))
+                continue
+            state = ((state or 0) | (exit_state or 0)) & state_mask
+            if cpu is None:
+                cpu = -1
+            if comm is not None:
+                comm = comm.split(b'\0', 1)[0]
+                comm = comm.decode('utf-8', 'replace')
+            table.add(pid, tgid, address, cpu, state, parent or 0,
+                      comm or '')
+            located.append(address)
+        return located
+
+    def setup_tasks(self, lazy=False):
+        """
+        Locates the tasks in the system and creates a gdb thread for each
+
+        Args:
+            lazy (bool, optional, default=False): Only record each task in
+                the task table now.  The tasks that were running are set
+                up immediately and the rest the first time they are
+                requested from crash.cache.tasks.
+        """
         gdb.execute('set print thread-events 0')
 
         init_task = gdb.lookup_global_symbol('init_task')
-        task_list = init_task.value()['tasks']
         runqueues = gdb.lookup_global_symbol('runqueues')
+        self.task_struct_type = init_task.type
 
         rqs = get_percpu_var(runqueues)
-        rqscurrs = {long(x["curr"]) : k for (k, x) in rqs.items()}
-
-        self.pid_to_task_struct = {}
+        self.rqscurrs = {long(x["curr"]) : k for (k, x) in rqs.items()}
 
         print("Loading tasks...", end='')
         sys.stdout.flush()
 
-        task_count = 0
-        tasks = []
-        for taskg in list_for_each_entry(task_list, init_task.type, 'tasks'):
-            tasks.append(taskg)
-            for task in list_for_each_entry(taskg['thread_group'], init_task.type, 'thread_group'):
-                tasks.append(task)
-
-        for task in tasks:
-            cpu = None
-            regs = None
-            active = long(task.address) in rqscurrs
-            if active:
-                cpu = rqscurrs[long(task.address)]
-                regs = self.vmcore.attr.cpu[cpu].reg
-
-            ltask = LinuxTask(task, active, cpu, regs)
-            ptid = (LINUX_KERNEL_PID, task['pid'], 0)
-            try:
-                thread = gdb.selected_inferior().new_thread(ptid, ltask)
-            except gdb.error as e:
-                print("Failed to setup task @{:#x}".format(long(task.address)))
-                continue
-            thread.name = task['comm'].string()
+        located = self.locate_tasks(init_task.value())
 
-            self.target.arch.setup_thread_info(thread)
-            ltask.attach_thread(thread)
-            ltask.set_get_stack_pointer(self.target.arch.get_stack_pointer)
+        if lazy:
+            for address in located:
+                if address in self.rqscurrs:
+                    self.load_task(address)
+            crash.cache.tasks.set_task_loader(self.load_task)
+            print(" done. ({} tasks total, set up on demand)"
+                  .format(len(located)))
+            gdb.selected_inferior().executing = False
+            return
 
-            crash.cache.tasks.cache_task(ltask)
+        task_count = 0
+        for address in located:
+            task = gdb.Value(address).cast(self.task_struct_type.pointer())
+            if self.setup_task(task.dereference()) is None:
+                continue
 
             task_count += 1
             if task_count % 100 == 0:
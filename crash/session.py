@@ -9,6 +9,8 @@ import gdb
 import sys
 
 from crash.infra import autoload_submodules
+from crash.infra.profiler import StartupProfiler
+import crash.infra.profiler
 import crash.kernel
 from kdumpfile import kdumpfile
 
@@ -29,28 +31,66 @@ class Session(object):
             search for kernel modules and debuginfo
         debug (bool, optional, default=False): Whether to enable verbose
             debugging output
+        lazy_modules (bool, optional, default=False): Whether to defer
+            loading each module's symbols until they are needed
+        lazy_tasks (bool, optional, default=False): Whether to defer
+            setting up each task until it is used
+        profile (bool, optional, default=False): Whether to print a
+            breakdown of the startup cost, including Python allocations
+        profile_output (str, optional): A file to save the startup
+            profile to as JSON
     """
 
 
     def __init__(self, kernel_exec=None, vmcore=None, kernelpath=None,
-                 searchpath=None, debug=False):
+                 searchpath=None, debug=False, lazy_modules=False,
+                 lazy_tasks=False, profile=False, profile_output=None):
         self.vmcore_filename = vmcore
+        self.kernel = None
+
+        profiler = StartupProfiler(self.read_counters,
+                                   trace_allocations=profile)
+        profiler.metadata = {
+            'kernel' : kernel_exec,
+            'vmcore' : vmcore,
+            'python' : sys.version.split()[0],
+            'lazy_modules' : lazy_modules,
+            'lazy_tasks' : lazy_tasks,
+        }
+        self.profiler = profiler
 
         print("crash-python initializing...")
         if searchpath is None:
             searchpath = []
 
         if kernel_exec:
-            self.kernel = crash.kernel.CrashKernel(kernel_exec, searchpath)
-            self.kernel.attach_vmcore(vmcore, debug)
-            self.kernel.open_kernel()
+            with profiler.phase('open kernel image'):
+                self.kernel = crash.kernel.CrashKernel(kernel_exec, searchpath)
+            with profiler.phase('attach vmcore'):
+                self.kernel.attach_vmcore(vmcore, debug)
+            with profiler.phase('load kernel symbols'):
+                self.kernel.open_kernel()
 
-        autoload_submodules('crash.cache')
-        autoload_submodules('crash.subsystem')
-        autoload_submodules('crash.commands')
+        for package in ['crash.cache', 'crash.subsystem', 'crash.commands']:
+            with profiler.phase('autoload {}'.format(package)):
+                autoload_submodules(package, profiler=profiler)
 
         if kernel_exec:
-            self.kernel.setup_tasks()
-            self.kernel.load_modules(searchpath)
+            with profiler.phase('setup tasks'):
+                self.kernel.setup_tasks(lazy=lazy_tasks)
+            with profiler.phase('load modules'):
+                self.kernel.load_modules(lazy=lazy_modules)
+
+        profiler.finish()
+        crash.infra.profiler.startup_profile = profiler
 
+        if profile:
+            profiler.report()
+        if profile_output:
+            profiler.save(profile_output)
 
+    def read_counters(self):
+        target = getattr(self.kernel, 'target', None)
+        if target is None:
+            return None
+        return target.read_stats.snapshot()
@@ -7,7 +7,8 @@ from __future__ import division
 
 import gdb
 import sys
-from crash.util import container_of
+import struct
+from crash.util import container_of, TypesUtilClass
 from crash.infra import CrashBaseClass, export
 
 if sys.version_info.major >= 3:
@@ -84,6 +85,72 @@ class TypesListClass(CrashBaseClass):
         if pending_exception is not None:
             raise pending_exception
 
+    def pointer_struct(self):
+        try:
+            return self._pointer_struct
+        except AttributeError:
+            pass
+
+        size = self.list_head_type.pointer().sizeof
+        fmt = 'Q' if size == 8 else 'I'
+        order = TypesUtilClass.target_byte_order()
+        self._pointer_struct = struct.Struct(order + fmt)
+        return self._pointer_struct
+
+    @export
+    def list_for_each_raw(self, list_head):
+        """
+        Collects the addresses of the nodes in a list without creating
+        gdb.Values
+
+        Only the next pointers are followed, with one small read per
+        node.  This is much faster than list_for_each for long lists but
+        doesn't check the prev pointers.
+
+        Args:
+            list_head (gdb.Value or long): The head of the list, either
+                as a struct list_head or its address
+
+        Returns:
+            list of long: The address of each struct list_head in the list,
+                not including the head
+
+        Raises:
+            CorruptListError: A NULL or unreadable next pointer was found
+            ListCycleError: The list doesn't lead back to the head
+        """
+        if isinstance(list_head, gdb.Value):
+            if list_head.type == self.list_head_type.pointer():
+                head = long(list_head)
+            else:
+                head = long(list_head.address)
+        else:
+            head = long(list_head)
+
+        ptr = self.pointer_struct()
+        inferior = gdb.selected_inferior()
+
+        nodes = []
+        seen = set()
+        addr = head
+        while True:
+            try:
+                data = inferior.read_memory(addr, ptr.size)
+            except gdb.MemoryError as e:
+                raise CorruptListError("Failed to read list_head {:#x}: {}"
+                                       .format(addr, str(e)))
+            addr = ptr.unpack_from(data)[0]
+            if addr == head:
+                break
+            if addr == 0:
+                raise CorruptListError("next pointer is NULL")
+            if addr in seen:
+                raise ListCycleError("Cycle in list detected.")
+            seen.add(addr)
+            nodes.append(addr)
+
+        return nodes
+
     @export
     def list_for_each_entry(self, list_head, gdbtype, member):
         for node in list_for_each(list_head):
@@ -33,6 +33,29 @@ class TypesPerCPUClass(CrashBaseClass):
     def setup_nr_cpus(cls, ignored):
         cls.nr_cpus = array_size(cls.__per_cpu_offset)
 
+    def possible_cpus(self):
+        if hasattr(self, 'possible_cpu_list'):
+            return self.possible_cpu_list
+
+        cpus = list(range(0, self.nr_cpus))
+        for name in ['__cpu_possible_mask', 'cpu_possible_map']:
+            sym = gdb.lookup_symbol(name, None)[0]
+            if sym is None:
+                continue
+            bits = sym.value()['bits']
+            wordsize = bits[0].type.sizeof * 8
+            cpus = []
+            for word in range(0, array_size(bits)):
+                value = long(bits[word])
+                for bit in range(0, wordsize):
+                    if value & (1 << bit):
+                        cpus.append(word * wordsize + bit)
+            cpus = [ cpu for cpu in cpus if cpu < self.nr_cpus ]
+            break
+
+        self.possible_cpu_list = cpus
+        return cpus
+
     def __is_percpu_var(self, var):
         if long(var) < self.__per_cpu_start:
             return False
@@ -58,6 +81,29 @@ class TypesPerCPUClass(CrashBaseClass):
         vartype = var.type
         return addr.cast(vartype).dereference()
 
+    @export
+    def get_percpu_ptr_addresses(self, ptr):
+        """
+        Returns the address of each possible cpu's copy of a dynamically
+        allocated percpu object
+
+        The addresses are computed without creating a gdb.Value for each
+        cpu, so the copies can be read together with read_many.
+
+        Args:
+            ptr (gdb.Value or long): A __percpu pointer, such as one
+                returned by alloc_percpu
+
+        Returns:
+            list of (int, long): The cpu and the address of its copy
+        """
+        if not hasattr(self, 'per_cpu_offsets'):
+            self.per_cpu_offsets = [ long(self.__per_cpu_offset[cpu])
+                                     for cpu in range(0, self.nr_cpus) ]
+        ptr = long(ptr)
+        return [ (cpu, ptr + self.per_cpu_offsets[cpu])
+                 for cpu in self.possible_cpus() ]
+
     @export
     def get_percpu_var(self, var, cpu=None):
         # Percpus can be:
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import gdb
+import sys
+from array import array
+from bisect import bisect_right
+
+if sys.version_info.major >= 3:
+    long = int
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from crash.infra import CrashBaseClass, export
+from crash.util import read_fields, read_many, TypesUtilClass
+import crash.cache.tasks
+
+def buffer_words(buf, wordsize=8, byteorder='<'):
+    """
+    Returns the words in a buffer as a NumPy array if NumPy is available
+    or as an array.array otherwise
+    """
+    if isinstance(buf, memoryview):
+        buf = buf.tobytes()
+    buf = buf[:len(buf) - len(buf) % wordsize]
+
+    if numpy is not None:
+        return numpy.frombuffer(buf, dtype="{}u{}".format(byteorder,
+                                                          wordsize))
+
+    typecode = 'Q' if wordsize == 8 else 'I'
+    words = array(typecode)
+    if sys.version_info.major >= 3:
+        words.frombytes(buf)
+    else:
+        words.fromstring(buf)
+    if (byteorder == '<') != (sys.byteorder == 'little'):
+        words.byteswap()
+    return words
+
+def find_words(buf, values, wordsize=8, byteorder='<'):
+    """
+    Finds the words in a buffer that have any of a set of values
+
+    NumPy is used to compare all of the words at once if it is
+    available.
+
+    Args:
+        buf (memoryview or bytes): The memory to search
+        values (set of long): The values to look for
+        wordsize (int, optional, default=8): The size of a word, 4 or 8
+        byteorder (str, optional, default='<'): '<' for little endian or
+            '>' for big endian
+
+    Returns:
+        list of (int, long): The offset and value of each matching
+            word, in order
+    """
+    if not values:
+        return []
+    words = buffer_words(buf, wordsize, byteorder)
+
+    if numpy is not None:
+        wanted = numpy.array(sorted(values), dtype=words.dtype)
+        hits = numpy.nonzero(numpy.isin(words, wanted))[0]
+        return [ (int(index) * wordsize, long(words[index]))
+                 for index in hits ]
+
+    return [ (index * wordsize, long(word))
+             for index, word in enumerate(words) if word in values ]
+
+def find_words_in_ranges(buf, ranges, wordsize=8, byteorder='<'):
+    """
+    Finds the words in a buffer that fall within any of a set of ranges
+
+    Args:
+        buf (memoryview or bytes): The memory to search
+        ranges (list of (long, long)): The [start, end) ranges to look
+            for, sorted and not overlapping
+        wordsize (int, optional, default=8): The size of a word, 4 or 8
+        byteorder (str, optional, default='<'): '<' for little endian or
+            '>' for big endian
+
+    Returns:
+        list of (int, long): The offset and value of each matching
+            word, in order
+    """
+    if not ranges:
+        return []
+    words = buffer_words(buf, wordsize, byteorder)
+    starts = [ start for start, end in ranges ]
+    ends = [ end for start, end in ranges ]
+
+    if numpy is not None:
+        starts = numpy.array(starts, dtype=words.dtype)
+        ends = numpy.array(ends, dtype=words.dtype)
+        index = numpy.searchsorted(starts, words, side='right') - 1
+        inside = index >= 0
+        inside[inside] = words[inside] < ends[index[inside]]
+        hits = numpy.nonzero(inside)[0]
+        return [ (int(pos) * wordsize, long(words[pos])) for pos in hits ]
+
+    lowest = starts[0]
+    highest = ends[-1]
+    matches = []
+    for pos, word in enumerate(words):
+        if word < lowest or word >= highest:
+            continue
+        index = bisect_right(starts, word) - 1
+        if word < ends[index]:
+            matches.append((pos * wordsize, long(word)))
+    return matches
+
+class TypesStackClass(CrashBaseClass):
+    __types__ = [ 'struct task_struct', 'unsigned long' ]
+
+    # The number of stacks read with each batched read
+    batch = 256
+
+    @classmethod
+    def thread_size(cls):
+        if not hasattr(cls, '_thread_size'):
+            try:
+                cls._thread_size = gdb.lookup_type('union thread_union').sizeof
+            except gdb.error:
+                cls._thread_size = 16384
+        return cls._thread_size
+
+    @export
+    def task_stacks(self, pids):
+        """
+        Returns the base address of the stacks of a set of tasks
+
+        The stack pointers of all of the tasks are read at once from
+        their task_structs, without setting up the tasks.
+
+        Args:
+            pids (list of int): The pids of the tasks, which must be in
+                the task table
+
+        Returns:
+            list of long: The base of each task's stack, or None if it
+                couldn't be read
+        """
+        table = crash.cache.tasks.task_table
+        addresses = [ table.address[table.row(pid)] for pid in pids ]
+        return [ values[0] for values in
+                 read_fields(addresses, self.task_struct_type, ['stack']) ]
+
+    def scan_stacks(self, pids, find):
+        """
+        Reads the kernel stacks of tasks and collects the matching words
+
+        Args:
+            pids (list of int): The tasks to search, or None for all tasks
+                in the task table
+            find (callable): Called as find(buf, wordsize, byteorder) for
+                each stack, returning the (offset, value) of each match
+
+        Returns:
+            list of (int, long, int, long): The pid, the stack base, the
+                offset within the stack and the value of each match
+        """
+        if pids is None:
+            pids = crash.cache.tasks.task_table.pids()
+
+        wordsize = self.unsigned_long_type.sizeof
+        order = TypesUtilClass.target_byte_order()
+        size = self.thread_size()
+
+        matches = []
+        for start in range(0, len(pids), self.batch):
+            chunk = pids[start:start + self.batch]
+            stacks = self.task_stacks(chunk)
+            ranges = [ (stack, size) for stack in stacks if stack ]
+            bufs = iter(read_many(ranges))
+            for pid, stack in zip(chunk, stacks):
+                if not stack:
+                    continue
+                buf = next(bufs)
+                if buf is None:
+                    continue
+                for offset, value in find(buf, wordsize, order):
+                    matches.append((pid, stack, offset, value))
+        return matches
+
+    @export
+    def search_stacks(self, values, pids=None):
+        """
+        Searches the kernel stacks of tasks for words with given values
+
+        Each stack is read with a single read and the stacks are read
+        in batches, so a search across every task is a few large reads
+        rather than one per word.
+
+        Args:
+            values (list of long): The values to search for
+            pids (list of int, optional): The tasks to search.  All tasks
+                in the task table are searched if not given.
+
+        Returns:
+            list of (int, long, int, long): The pid, the stack base, the
+                offset within the stack and the value of each match
+        """
+        mask = (1 << (self.unsigned_long_type.sizeof * 8)) - 1
+        wanted = set(long(value) & mask for value in values)
+        return self.scan_stacks(pids, lambda buf, wordsize, order:
+                                find_words(buf, wanted, wordsize, order))
+
+    @export
+    def search_stacks_for_ranges(self, ranges, pids=None):
+        """
+        Searches the kernel stacks of tasks for words within address ranges
+
+        Args:
+            ranges (list of (long, long)): The [start, end) ranges to
+                search for
+            pids (list of int, optional): The tasks to search.  All tasks
+                in the task table are searched if not given.
+
+        Returns:
+            list of (int, long, int, long): The pid, the stack base, the
+                offset within the stack and the value of each match
+        """
+        ranges = sorted(ranges)
+        return self.scan_stacks(pids, lambda buf, wordsize, order:
+                                find_words_in_ranges(buf, ranges, wordsize,
+                                                     order))
@@ -7,13 +7,17 @@ from __future__ import division
 
 import gdb
 import sys
+import struct
 
 if sys.version_info.major >= 3:
     long = int
 
-from crash.util import array_size
+from crash.util import array_size, offsetof_type, read_many
+from crash.util import TypesUtilClass
 from crash.infra import CrashBaseClass
 from crash.infra.lookup import DelayedValue, ClassProperty, get_delayed_lookup
+from crash.types.percpu import get_percpu_ptr_addresses
+import crash.cache.tasks
 
 PF_EXITING = long(0x4)
 
@@ -99,9 +103,17 @@ class BadTaskError(TypeError):
         super(BadTaskError, self).__init__(self.msgtemplate.format(typedesc))
 
 class LinuxTask(object):
+    # There can be hundreds of thousands of these, so avoid a __dict__
+    # for each one.
+    __slots__ = [ 'task_struct', 'address', 'pid', 'active', 'cpu', 'regs',
+                  'thread_info', 'stack_pointer', 'valid_stack', 'thread' ]
+
     task_struct_type = None
+    mm_struct_type = None
     mm_struct_fields = None
     get_rss = None
+    rss_counters = None
+    task_rss_stat = None
     get_stack_pointer_fn = None
     valid = False
 
@@ -117,20 +129,20 @@ class LinuxTask(object):
                 raise BadTaskError(task_struct)
 
         self.task_struct = task_struct
+        if task_struct.type == self.task_struct_type.pointer():
+            self.address = long(task_struct)
+        else:
+            self.address = long(task_struct.address)
+        self.pid = int(task_struct['pid'])
         self.active = active
         self.cpu = cpu
         self.regs = regs
 
         self.thread_info = None
         self.stack_pointer = None
+        self.valid_stack = False
         self.thread = None
 
-        # mem data
-        self.mem_valid = False
-        self.rss = 0
-        self.total_vm = 0
-        self.pgd_addr = 0
-
     @classmethod
     def init_task_types(cls, task):
         if not cls.valid:
@@ -146,8 +158,10 @@ class LinuxTask(object):
             cls.task_struct_type = task.type
             fields = cls.task_struct_type.fields()
             cls.task_state_has_exit_state = 'exit_state' in fields
-            cls.mm_struct_fields = gdb.lookup_type('struct mm_struct').keys()
+            cls.mm_struct_type = gdb.lookup_type('struct mm_struct')
+            cls.mm_struct_fields = cls.mm_struct_type.keys()
             cls.pick_get_rss()
+            cls.pick_task_rss_stat()
             cls.pick_last_run()
             cls.init_mm = get_value('init_mm')
             cls.valid = True
@@ -176,8 +190,10 @@ class LinuxTask(object):
         return state
 
     def maybe_dead(self):
-        state = self.task_state()
+        return self.state_maybe_dead(self.task_state())
 
+    @staticmethod
+    def state_maybe_dead(state):
         known = TF.TASK_INTERRUPTIBLE
         known |= TF.TASK_UNINTERRUPTIBLE
         known |= TF.TASK_ZOMBIE
@@ -196,22 +212,44 @@ class LinuxTask(object):
     def is_zombie(self):
         return self.task_state() & TF.TASK_ZOMBIE
 
-    def update_mem_usage(self):
-        if self.mem_valid:
-            return
+    @classmethod
+    def mm_usage(cls, mm, threads=None):
+        """
+        Returns the memory usage of an mm_struct
+
+        All of the threads of a process share one mm_struct, so its
+        usage is only read once and is then cached by address.
+
+        Args:
+            mm (gdb.Value or long): The mm_struct pointer or its address
+            threads (list of long, optional): The task_struct addresses
+                of the tasks using the mm_struct.  On kernels where each
+                task counts RSS changes before adding them to the
+                mm_struct, the pending counts of these tasks are
+                included.  Only used when the usage isn't cached yet.
+
+        Returns:
+            tuple of (long, long, long): The resident set size in pages,
+                the virtual memory size in pages and the address of
+                the page global directory
+        """
+        address = long(mm)
+        try:
+            return crash.cache.tasks.mm_usage[address]
+        except KeyError:
+            pass
 
-        if self.is_zombie() or self.is_exiting():
-            return
+        if not isinstance(mm, gdb.Value):
+            mm = gdb.Value(address).cast(cls.mm_struct_type.pointer())
+        mm = mm.dereference()
 
-        mm = self.task_struct['mm']
-        if not mm:
-            self.mem_valid = True
-            return
+        rss = cls.get_rss(mm)
+        if threads and cls.task_rss_stat is not None:
+            rss += cls.pending_rss(threads)
 
-        self.rss = self.get_rss()
-        self.total_vm = long(mm['total_vm'])
-        self.pgd_addr = long(mm['pgd'])
-        self.mem_valid = True
+        usage = (max(rss, 0), long(mm['total_vm']), long(mm['pgd']))
+        crash.cache.tasks.mm_usage[address] = usage
+        return usage
 
     def is_kernel_task(self):
         if self.task_struct['pid'] == 0:
@@ -239,26 +277,46 @@ class LinuxTask(object):
         fn = cls.get_stack_pointer_fn
         return fn(self.thread)
 
-    def get_rss_field(self):
-        return long(self.task_struct['mm']['rss'].value())
+    @staticmethod
+    def get_rss_field(mm):
+        return long(mm['rss'].value())
 
-    def get__rss_field(self):
-        return long(self.task_struct['mm']['_rss'].value())
+    @staticmethod
+    def get__rss_field(mm):
+        return long(mm['_rss'].value())
 
-    def get_rss_stat_field(self):
-        stat = self.task_struct['mm']['rss_stat']['count']
-        stat0 = self.task_struct['mm']['rss_stat']['count'][0]
+    @classmethod
+    def get_rss_stat_field(cls, mm):
+        stat = mm['rss_stat']['count']
         rss = 0
-        for i in range(stat.type.sizeof // stat[0].type.sizeof):
+        for i in cls.rss_counters:
             rss += long(stat[i]['counter'])
         return rss
 
-    def get_anon_file_rss_fields(self):
-        mm = self.task_struct['mm']
+    @classmethod
+    def get_rss_percpu_counters(cls, mm):
+        # Each counter is a total plus a delta for each cpu that hasn't
+        # been folded into it yet.  The deltas are read together.
+        stat = mm['rss_stat']
+        rss = 0
+        ranges = []
+        for i in cls.rss_counters:
+            rss += long(stat[i]['count'])
+            counters = stat[i]['counters']
+            if counters:
+                ranges += [ (address, cls.percpu_delta.size) for cpu, address
+                            in get_percpu_ptr_addresses(counters) ]
+        for buf in read_many(ranges):
+            if buf is not None:
+                rss += cls.percpu_delta.unpack_from(buf)[0]
+        return rss
+
+    @classmethod
+    def get_anon_file_rss_fields(cls, mm):
         rss = 0
         for name in ['_anon_rss', '_file_rss']:
-            if name in mm_struct_fields:
-                if mm[name].type == self.atomic_long_type:
+            if name in cls.mm_struct_fields:
+                if mm[name].type == cls.atomic_long_type:
                     rss += long(mm[name]['counter'])
                 else:
                     rss += long(mm[name])
@@ -274,9 +332,15 @@ class LinuxTask(object):
         elif '_rss' in cls.mm_struct_fields:
             cls.get_rss = cls.get__rss_field
         elif 'rss_stat' in cls.mm_struct_fields:
-            cls.MM_FILEPAGES = get_value('MM_FILEPAGES')
-            cls.MM_ANONPAGES = get_value('MM_ANONPAGES')
-            cls.get_rss = cls.get_rss_stat_field
+            cls.pick_rss_counters()
+            stat = cls.mm_struct_type['rss_stat'].type.strip_typedefs()
+            if stat.code == gdb.TYPE_CODE_ARRAY:
+                # Since Linux 6.2, each counter is a percpu_counter
+                order = TypesUtilClass.target_byte_order()
+                cls.percpu_delta = struct.Struct(order + 'i')
+                cls.get_rss = cls.get_rss_percpu_counters
+            else:
+                cls.get_rss = cls.get_rss_stat_field
         elif '_anon_rss' in cls.mm_struct_fields or \
              '_file_rss' in cls.mm_struct_fields:
             cls.atomic_long_type = gdb.lookup_type('atomic_long_t')
@@ -284,6 +348,55 @@ class LinuxTask(object):
         else:
             raise RuntimeError("No method to retrieve RSS from task found.")
 
+    @classmethod
+    def pick_rss_counters(cls):
+        # The resident pages are the file, anonymous and shared memory
+        # counters.  The others, e.g. MM_SWAPENTS, count pages that
+        # aren't resident.
+        cls.rss_counters = []
+        for name, default in [ ('MM_FILEPAGES', 0), ('MM_ANONPAGES', 1),
+                               ('MM_SHMEMPAGES', None) ]:
+            value = get_value(name)
+            if value is not None:
+                cls.rss_counters.append(long(value))
+            elif default is not None:
+                cls.rss_counters.append(default)
+
+    @classmethod
+    def pick_task_rss_stat(cls):
+        # Kernels with SPLIT_RSS_COUNTING keep per-task counts that are
+        # only added to the mm_struct from time to time.
+        cls.task_rss_stat = None
+        res = offsetof_type(cls.task_struct_type, 'rss_stat.count', False)
+        if res is None:
+            return
+        offset, counttype = res
+        count = counttype.sizeof // counttype.target().sizeof
+        order = TypesUtilClass.target_byte_order()
+        cls.task_rss_stat = (offset, struct.Struct(order + 'i' * count))
+
+    @classmethod
+    def pending_rss(cls, threads):
+        """
+        Returns the RSS changes that tasks haven't added to their
+        mm_struct yet
+
+        Args:
+            threads (list of long): The task_struct addresses
+
+        Returns:
+            long: The sum of the pending counts, which may be negative
+        """
+        offset, counts = cls.task_rss_stat
+        rss = 0
+        for buf in read_many([ (address + offset, counts.size)
+                               for address in threads ]):
+            if buf is not None:
+                values = counts.unpack_from(buf)
+                rss += sum(values[i] for i in cls.rss_counters
+                           if i < len(values))
+        return rss
+
     def last_run__last_run(self):
         return long(self.task_struct['last_run'])
 
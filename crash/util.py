@@ -6,9 +6,23 @@ from __future__ import print_function
 from __future__ import division
 
 import gdb
+import struct
 from crash.infra import CrashBaseClass, export
 from crash.exceptions import MissingTypeError, MissingSymbolError
 
+# Callables consulted when a symbol or type lookup fails.  Each is called
+# with the kind of lookup ('symbol' or 'type') and the name and returns
+# True if it made new symbols available and the lookup should be retried.
+# The kernel uses this to load module symbols on demand.
+lookup_fallbacks = []
+
+def _lookup_fallback(kind, name):
+    retry = False
+    for fallback in lookup_fallbacks:
+        if fallback(kind, name):
+            retry = True
+    return retry
+
 class OffsetOfError(Exception):
     """Generic Exception for offsetof errors"""
     def __init__(self, message):
@@ -120,6 +134,8 @@ class TypesUtilClass(CrashBaseClass):
         if domain is None:
             domain = gdb.SYMBOL_VAR_DOMAIN
         sym = gdb.lookup_symbol(symname, block, domain)[0]
+        if sym is None and _lookup_fallback('symbol', symname):
+            sym = gdb.lookup_symbol(symname, block, domain)[0]
         if sym:
             return sym.value()
         raise MissingSymbolError("Cannot locate symbol {}".format(symname))
@@ -170,8 +186,14 @@ class TypesUtilClass(CrashBaseClass):
             try:
                 gdbtype = gdb.lookup_type(val)
             except gdb.error:
-                raise MissingTypeError("Could not resolve type {}"
-                                       .format(val))
+                if not _lookup_fallback('type', val):
+                    raise MissingTypeError("Could not resolve type {}"
+                                           .format(val))
+                try:
+                    gdbtype = gdb.lookup_type(val)
+                except gdb.error:
+                    raise MissingTypeError("Could not resolve type {}"
+                                           .format(val))
         elif isinstance(val, gdb.Symbol):
             gdbtype = val.value().type
         else:
@@ -342,6 +364,127 @@ class TypesUtilClass(CrashBaseClass):
         """
         return value.type.sizeof // value[0].type.sizeof
 
+    @export
+    @staticmethod
+    def read_many(ranges):
+        """
+        Reads many ranges of memory at once
+
+        When the current target is a kdump target, the ranges are
+        coalesced by page and read with as few reads as possible.
+        Otherwise each range is read separately.
+
+        Args:
+            ranges (list of (long, long)): The (address, length) pairs
+                to read
+
+        Returns:
+            list of memoryview: The contents of each range, in the order
+                requested.  Ranges that could not be read are None.
+        """
+        target = gdb.current_target()
+        if hasattr(target, 'read_many'):
+            return target.read_many(ranges)
+
+        inferior = gdb.selected_inferior()
+        results = []
+        for addr, length in ranges:
+            try:
+                results.append(memoryview(inferior.read_memory(addr, length)))
+            except gdb.MemoryError:
+                results.append(None)
+        return results
+
+    @staticmethod
+    def target_byte_order():
+        endian = gdb.execute("show endian", to_string=True)
+        if 'big endian' in endian:
+            return '>'
+        return '<'
+
+    @export
+    @classmethod
+    def field_structs(cls, gdbtype, specs):
+        """
+        Returns the offset and struct.Struct to decode each of a set of
+        members of a structure from raw memory
+
+        Args:
+            gdbtype (gdb.Type): The type of the structure
+            specs (list of str): The members to decode.  Each is resolved
+                as with offsetof and must be an integer, enum or pointer
+                of 1, 2, 4 or 8 bytes, or an array of char, which is
+                decoded as bytes.
+
+        Returns:
+            list of (long, struct.Struct): The offset and decoder for each
+                member, or None for members that don't exist in the type
+        """
+        codes = { 1 : 'b', 2 : 'h', 4 : 'i', 8 : 'q' }
+        order = cls.target_byte_order()
+
+        fields = []
+        for spec in specs:
+            res = offsetof_type(gdbtype, spec, False)
+            if res is None:
+                fields.append(None)
+                continue
+            offset, fieldtype = res
+            fieldtype = fieldtype.strip_typedefs()
+            if fieldtype.code == gdb.TYPE_CODE_ARRAY:
+                code = "{}s".format(fieldtype.sizeof)
+            else:
+                code = codes[fieldtype.sizeof]
+                if (fieldtype.code == gdb.TYPE_CODE_PTR or
+                        not getattr(fieldtype, 'is_signed', True) or
+                        'unsigned' in str(fieldtype)):
+                    code = code.upper()
+            fields.append((offset, struct.Struct(order + code)))
+        return fields
+
+    @export
+    @classmethod
+    def read_fields(cls, addresses, gdbtype, specs):
+        """
+        Reads members of many structures at once
+
+        The members are read with a single batched read_many call and
+        decoded with struct instead of being read through gdb.Values.
+
+        Args:
+            addresses (list of long): The address of each structure
+            gdbtype (gdb.Type): The type of the structures
+            specs (list of str): The members to read, as for field_structs.
+                Members that don't exist in the type are returned as None.
+
+        Returns:
+            list of tuple: The values of the members for each structure,
+                in the order of specs.  Values that couldn't be read are
+                None.
+        """
+        fields = cls.field_structs(gdbtype, specs)
+
+        ranges = []
+        for address in addresses:
+            for field in fields:
+                if field is not None:
+                    ranges.append((address + field[0], field[1].size))
+        bufs = iter(read_many(ranges))
+
+        results = []
+        for address in addresses:
+            values = []
+            for field in fields:
+                if field is None:
+                    values.append(None)
+                    continue
+                buf = next(bufs)
+                if buf is not None:
+                    buf = field[1].unpack_from(buf)[0]
+                values.append(buf)
+            results.append(tuple(values))
+        return results
+
     @export
     @staticmethod
     def get_typed_pointer(val, gdbtype):
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+
+from crash.kdump.pagecache import PageCache, coalesce_ranges
+
+PAGE_SIZE = 4096
+
+class FakeMemory(object):
+    def __init__(self, npages, missing=None):
+        self.size = npages * PAGE_SIZE
+        self.missing = missing or set()
+        self.reads = []
+
+    def byte(self, addr):
+        return (addr * 7 + (addr >> 12)) & 0xff
+
+    def expected(self, addr, length):
+        return bytearray(self.byte(a) for a in range(addr, addr + length))
+
+    def __call__(self, addr, length):
+        self.reads.append((addr, length))
+        for pfn in range(addr // PAGE_SIZE, (addr + length - 1) // PAGE_SIZE + 1):
+            if pfn in self.missing:
+                raise IOError("page {} is missing".format(pfn))
+        if addr + length > self.size:
+            raise EOFError()
+        return self.expected(addr, length)
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.mem = FakeMemory(64)
+
+    def test_bad_page_size(self):
+        with self.assertRaises(ValueError):
+            PageCache(self.mem, 3000)
+
+    def test_sub_page_reads(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 16 * PAGE_SIZE)
+        for offset in range(0, 512, 8):
+            data = cache.read(PAGE_SIZE + offset, 8)
+            self.assertTrue(data == self.mem.expected(PAGE_SIZE + offset, 8))
+        self.assertTrue(cache.misses == 1)
+        self.assertTrue(cache.hits == 63)
+
+    def test_page_spanning_read(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 16 * PAGE_SIZE)
+        data = cache.read(2 * PAGE_SIZE - 4, 8)
+        self.assertTrue(data == self.mem.expected(2 * PAGE_SIZE - 4, 8))
+        self.assertTrue(cache.misses == 2)
+
+    def test_lru_eviction(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 8 * PAGE_SIZE)
+        for pfn in range(8):
+            cache.read(pfn * PAGE_SIZE, 8)
+        # Touch page 0 so that page 1 becomes the oldest
+        cache.read(0, 8)
+        cache.read(8 * PAGE_SIZE, 8)
+        self.assertTrue(cache.evictions == 1)
+        self.assertTrue(0 in cache.pages)
+        self.assertFalse(1 in cache.pages)
+
+    def test_resize(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 8 * PAGE_SIZE)
+        for pfn in range(8):
+            cache.read(pfn * PAGE_SIZE, 8)
+        cache.resize(2 * PAGE_SIZE)
+        self.assertTrue(len(cache.pages) == 2)
+        self.assertTrue(7 in cache.pages)
+
+    def test_disabled(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 0)
+        cache.read(0, 8)
+        cache.read(0, 8)
+        self.assertTrue(len(cache.pages) == 0)
+        self.assertTrue(len(self.mem.reads) == 2)
+
+    def test_large_read_bypasses_cache(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 16 * PAGE_SIZE)
+        data = cache.read(0, 8 * PAGE_SIZE)
+        self.assertTrue(len(data) == 8 * PAGE_SIZE)
+        self.assertTrue(cache.bypassed == 1)
+        self.assertTrue(len(cache.pages) == 0)
+
+    def test_error_on_first_page(self):
+        mem = FakeMemory(64, missing=set([3]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE)
+        with self.assertRaises(IOError):
+            cache.read(3 * PAGE_SIZE + 8, 8)
+
+    def test_partial_read(self):
+        mem = FakeMemory(64, missing=set([4]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE)
+        data = cache.read(4 * PAGE_SIZE - 8, 16)
+        self.assertTrue(len(data) == 8)
+
+    def test_negative_cache(self):
+        mem = FakeMemory(64, missing=set([5]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE, (IOError,))
+        for i in range(4):
+            with self.assertRaises(IOError):
+                cache.read(5 * PAGE_SIZE + i * 8, 8)
+        self.assertTrue(len(mem.reads) == 1)
+        self.assertTrue(cache.negative_misses == 1)
+        self.assertTrue(cache.negative_hits == 3)
+
+    def test_negative_cache_ignores_other_errors(self):
+        mem = FakeMemory(64, missing=set([5]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE, (EOFError,))
+        for i in range(2):
+            with self.assertRaises(IOError):
+                cache.read(5 * PAGE_SIZE, 8)
+        self.assertTrue(len(mem.reads) == 2)
+
+    def test_negative_cache_invalidate(self):
+        mem = FakeMemory(64, missing=set([5]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE, (IOError,))
+        with self.assertRaises(IOError):
+            cache.read(5 * PAGE_SIZE, 8)
+        mem.missing = set()
+        cache.invalidate_negative()
+        data = cache.read(5 * PAGE_SIZE, 8)
+        self.assertTrue(data == mem.expected(5 * PAGE_SIZE, 8))
+
+    def test_large_read_records_negative(self):
+        mem = FakeMemory(64, missing=set([6]))
+        cache = PageCache(mem, PAGE_SIZE, 16 * PAGE_SIZE, (IOError,))
+        data = cache.read(2 * PAGE_SIZE, 8 * PAGE_SIZE)
+        self.assertTrue(data == mem.expected(2 * PAGE_SIZE, 4 * PAGE_SIZE))
+        self.assertTrue(6 in cache.unavailable)
+        self.assertTrue(len(cache.pages) == 0)
+
+        # The known bad page is no longer read
+        del mem.reads[:]
+        data = cache.read(2 * PAGE_SIZE, 8 * PAGE_SIZE)
+        self.assertTrue(data == mem.expected(2 * PAGE_SIZE, 4 * PAGE_SIZE))
+        self.assertTrue(mem.reads == [ (2 * PAGE_SIZE, 4 * PAGE_SIZE) ])
+
+        with self.assertRaises(IOError):
+            cache.read(6 * PAGE_SIZE, 8 * PAGE_SIZE)
+        self.assertTrue(len(mem.reads) == 1)
+        self.assertTrue(cache.negative_hits == 1)
+
+    def test_readahead_sequential(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 64 * PAGE_SIZE, readahead=True)
+        for pfn in range(32):
+            data = cache.read(pfn * PAGE_SIZE + 16, 8)
+            self.assertTrue(data == self.mem.expected(pfn * PAGE_SIZE + 16, 8))
+        self.assertTrue(cache.readahead_issued > 0)
+        self.assertTrue(cache.readahead_hits > 0)
+        self.assertTrue(len(self.mem.reads) < 32)
+
+    def test_readahead_random(self):
+        cache = PageCache(self.mem, PAGE_SIZE, 64 * PAGE_SIZE, readahead=True)
+        for pfn in [3, 40, 7, 22, 61, 12, 50, 1, 33, 18]:
+            cache.read(pfn * PAGE_SIZE, 8)
+        self.assertTrue(cache.readahead_issued == 0)
+        self.assertTrue(len(self.mem.reads) == 10)
+
+    def test_readahead_error_falls_back(self):
+        mem = FakeMemory(64, missing=set([6]))
+        cache = PageCache(mem, PAGE_SIZE, 64 * PAGE_SIZE, (IOError,),
+                          readahead=True)
+        for pfn in range(6):
+            cache.read(pfn * PAGE_SIZE, 8)
+        with self.assertRaises(IOError):
+            cache.read(6 * PAGE_SIZE, 8)
+        self.assertTrue(6 in cache.unavailable)
+        data = cache.read(7 * PAGE_SIZE, 8)
+        self.assertTrue(data == mem.expected(7 * PAGE_SIZE, 8))
+
+class TestCoalesceRanges(unittest.TestCase):
+    def test_empty(self):
+        self.assertTrue(coalesce_ranges([], PAGE_SIZE) == [])
+
+    def test_same_page(self):
+        ranges = [ (0x1010, 8), (0x1000, 8), (0x1ff8, 8) ]
+        spans = coalesce_ranges(ranges, PAGE_SIZE)
+        self.assertTrue(len(spans) == 1)
+        self.assertTrue(spans[0][0] == 0x1000)
+        self.assertTrue(spans[0][1] == 0x2000)
+        self.assertTrue(spans[0][2] == [1, 0, 2])
+
+    def test_adjacent_pages(self):
+        ranges = [ (0x2008, 8), (0x1008, 8) ]
+        spans = coalesce_ranges(ranges, PAGE_SIZE)
+        self.assertTrue(spans == [ (0x1000, 0x3000, [1, 0]) ])
+
+    def test_distant_pages(self):
+        ranges = [ (0x9000, 8), (0x1000, 0x1800) ]
+        spans = coalesce_ranges(ranges, PAGE_SIZE)
+        self.assertTrue(spans == [ (0x1000, 0x3000, [1]),
+                                   (0x9000, 0xa000, [0]) ])
+
+    def test_max_span(self):
+        ranges = [ (n * PAGE_SIZE, PAGE_SIZE) for n in range(8) ]
+        spans = coalesce_ranges(ranges, PAGE_SIZE, 4 * PAGE_SIZE)
+        self.assertTrue(len(spans) == 2)
+        self.assertTrue(spans[1] == (4 * PAGE_SIZE, 8 * PAGE_SIZE,
+                                     [4, 5, 6, 7]))
+
+    def test_zero_length(self):
+        spans = coalesce_ranges([ (0x1000, 0) ], PAGE_SIZE)
+        self.assertTrue(spans == [])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import crash.infra.pathindex
+from crash.infra.pathindex import PathIndex, SearchPathScanner, list_directory
+
+class TestPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tree = os.path.join(self.tmpdir, 'tree')
+        self.cache = os.path.join(self.tmpdir, 'cache')
+        self.mtime = 1000000000
+
+        self.add_file('kernel/fs/ext4/ext4.ko')
+        self.add_file('kernel/drivers/foo-bar.ko')
+        self.add_file('usr/lib/debug/vmlinux.debug')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def touch_dir(self, path):
+        # Explicit mtimes keep the tests independent of timestamp
+        # granularity
+        self.mtime += 10
+        os.utime(path, (self.mtime, self.mtime))
+
+    def add_file(self, relpath):
+        path = os.path.join(self.tree, relpath)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        open(path, 'w').close()
+        self.touch_dir(dirname)
+        return path
+
+    def index(self):
+        return PathIndex(self.tree, self.cache).update()
+
+    def test_lookup(self):
+        index = self.index()
+        self.assertTrue(index.lookup('ext4.ko') ==
+                        os.path.join(self.tree, 'kernel/fs/ext4/ext4.ko'))
+        self.assertTrue(index.lookup('foo_bar.ko') ==
+                        os.path.join(self.tree, 'kernel/drivers/foo-bar.ko'))
+        self.assertTrue(index.lookup('missing.ko') is None)
+
+    def test_reused(self):
+        first = self.index()
+        self.assertTrue(first.dirs_listed == first.dirs_checked)
+
+        second = self.index()
+        self.assertTrue(second.dirs_listed == 0)
+        self.assertFalse(second.dirty)
+        self.assertTrue(second.names == first.names)
+
+    def test_new_file(self):
+        self.index()
+        path = self.add_file('kernel/fs/xfs/xfs.ko')
+        self.touch_dir(os.path.join(self.tree, 'kernel/fs'))
+
+        index = self.index()
+        self.assertTrue(index.lookup('xfs.ko') == path)
+        # kernel/fs and kernel/fs/xfs
+        self.assertTrue(index.dirs_listed == 2)
+
+    def test_removed_dir(self):
+        self.index()
+        shutil.rmtree(os.path.join(self.tree, 'kernel/fs/ext4'))
+        self.touch_dir(os.path.join(self.tree, 'kernel/fs'))
+
+        index = self.index()
+        self.assertTrue(index.lookup('ext4.ko') is None)
+        self.assertFalse('kernel/fs/ext4' in index.dirs)
+
+    def test_corrupt_index(self):
+        index = self.index()
+        with open(index.index_file(), 'w') as f:
+            f.write('{ not json')
+
+        index = self.index()
+        self.assertTrue(index.lookup('ext4.ko') is not None)
+        self.assertTrue(index.dirs_listed == index.dirs_checked)
+
+    def test_no_persist(self):
+        PathIndex(self.tree, self.cache, persist=False).update()
+        self.assertFalse(os.path.exists(self.cache))
+
+    def test_pool(self):
+        for n in range(20):
+            self.add_file('kernel/drivers/dir{}/mod{}.ko'.format(n, n))
+        serial = PathIndex(self.tree, persist=False)
+        serial.refresh()
+
+        pool = ThreadPool(4)
+        try:
+            parallel = PathIndex(self.tree, persist=False)
+            parallel.refresh(pool)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertTrue(parallel.dirs == serial.dirs)
+        self.assertTrue(parallel.names == serial.names)
+
+    def test_scanner(self):
+        other = os.path.join(self.tmpdir, 'other')
+        os.makedirs(other)
+        open(os.path.join(other, 'xfs.ko'), 'w').close()
+
+        scanner = SearchPathScanner(['', self.tree, other], self.cache)
+        indexes = scanner.wait()
+        self.assertTrue(scanner.error is None)
+        self.assertTrue(len(indexes) == 2)
+        self.assertTrue(indexes[other].lookup('xfs.ko') is not None)
+        self.assertTrue(indexes[self.tree].lookup('ext4.ko') is not None)
+
+class TestListDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'sub'))
+        open(os.path.join(self.tmpdir, 'file.ko'), 'w').close()
+        os.symlink('sub', os.path.join(self.tmpdir, 'dirlink'))
+        os.symlink('file.ko', os.path.join(self.tmpdir, 'filelink'))
+        os.symlink('missing', os.path.join(self.tmpdir, 'broken'))
+        self.scandir = crash.infra.pathindex.scandir
+
+    def tearDown(self):
+        crash.infra.pathindex.scandir = self.scandir
+        shutil.rmtree(self.tmpdir)
+
+    def check(self):
+        files, subdirs = list_directory(self.tmpdir)
+        self.assertTrue(files == [ 'broken', 'file.ko', 'filelink' ])
+        self.assertTrue(subdirs == [ 'sub' ])
+        self.assertTrue(list_directory(os.path.join(self.tmpdir,
+                                                    'nothere')) is None)
+        self.assertTrue(list_directory(os.path.join(self.tmpdir,
+                                                    'file.ko')) is None)
+
+    def test_list_directory(self):
+        self.check()
+
+    def test_list_directory_without_scandir(self):
+        crash.infra.pathindex.scandir = None
+        self.check()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+from crash.infra.profiler import StartupProfiler
+
+class FakeReads(object):
+    def __init__(self):
+        self.counters = None
+
+    def read(self, length):
+        if self.counters is None:
+            self.counters = { 'reads' : 0, 'bytes' : 0, 'time' : 0.0 }
+        self.counters['reads'] += 1
+        self.counters['bytes'] += length
+
+    def __call__(self):
+        return self.counters
+
+class TestStartupProfiler(unittest.TestCase):
+    def test_phases(self):
+        reads = FakeReads()
+        profiler = StartupProfiler(reads)
+        with profiler.phase('first'):
+            reads.read(4096)
+            reads.read(8)
+        with profiler.phase('second'):
+            pass
+        profiler.finish()
+
+        self.assertTrue([p['name'] for p in profiler.phases] ==
+                        ['first', 'second'])
+        self.assertTrue(profiler.phases[0]['reads'] == 2)
+        self.assertTrue(profiler.phases[0]['read_bytes'] == 4104)
+        self.assertTrue(profiler.phases[1]['reads'] == 0)
+
+    def test_phase_with_error(self):
+        profiler = StartupProfiler()
+        with self.assertRaises(RuntimeError):
+            with profiler.phase('broken'):
+                raise RuntimeError("failed")
+        self.assertTrue(len(profiler.phases) == 1)
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            profiler = StartupProfiler()
+            profiler.metadata['kernel'] = 'vmlinux'
+            with profiler.phase('only'):
+                pass
+            profiler.record_module('crash.commands.ps', 0.5, 0.25)
+            profiler.finish()
+
+            filename = os.path.join(tmpdir, 'profile.json')
+            profiler.save(filename)
+            with open(filename) as f:
+                data = json.load(f)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        self.assertTrue(data['metadata']['kernel'] == 'vmlinux')
+        self.assertTrue(data['phases'][0]['name'] == 'only')
+        self.assertTrue(data['modules'][0]['callback_time'] == 0.25)
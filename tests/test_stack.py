@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+import struct
+
+import crash.types.stack
+from crash.types.stack import find_words, find_words_in_ranges
+
+class TestFindWords(unittest.TestCase):
+    def setUp(self):
+        self.words = [ 0, 0xffff880012345678, 7, 0xffff880012345678,
+                       0xffffffff81000000 ]
+        self.numpy = crash.types.stack.numpy
+
+    def tearDown(self):
+        crash.types.stack.numpy = self.numpy
+
+    def check(self):
+        buf = struct.pack('<5Q', *self.words)
+        hits = find_words(buf, set([0xffff880012345678, 7]))
+        self.assertTrue(hits == [ (8, 0xffff880012345678), (16, 7),
+                                  (24, 0xffff880012345678) ])
+
+        buf = struct.pack('>5Q', *self.words)
+        hits = find_words(memoryview(buf), set([0xffffffff81000000]),
+                          byteorder='>')
+        self.assertTrue(hits == [ (32, 0xffffffff81000000) ])
+
+        buf = struct.pack('<3I', 1, 2, 3)
+        hits = find_words(buf, set([3]), wordsize=4)
+        self.assertTrue(hits == [ (8, 3) ])
+
+        self.assertTrue(find_words(buf, set()) == [])
+
+    def check_ranges(self):
+        buf = struct.pack('<5Q', *self.words)
+        ranges = [ (5, 8), (0xffff880000000000, 0xffff880012345678),
+                   (0xffffffff81000000, 0xffffffff81001000) ]
+        hits = find_words_in_ranges(buf, ranges)
+        self.assertTrue(hits == [ (16, 7), (32, 0xffffffff81000000) ])
+
+        buf = struct.pack('>5Q', *self.words)
+        hits = find_words_in_ranges(buf, [ (0, 1) ], byteorder='>')
+        self.assertTrue(hits == [ (0, 0) ])
+
+        self.assertTrue(find_words_in_ranges(buf, []) == [])
+
+    def test_find_words(self):
+        self.check()
+
+    def test_find_words_without_numpy(self):
+        crash.types.stack.numpy = None
+        self.check()
+
+    def test_find_words_in_ranges(self):
+        self.check_ranges()
+
+    def test_find_words_in_ranges_without_numpy(self):
+        crash.types.stack.numpy = None
+        self.check_ranges()
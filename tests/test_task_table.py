@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+
+from crash.cache.tasks import TaskTable
+
+class TestTaskTable(unittest.TestCase):
+    def setUp(self):
+        self.table = TaskTable()
+        self.table.add(1, 1, 0xffff880000001000, 0, 1, 0, 'systemd')
+        self.table.add(200, 200, 0xffff880000002000, 3, 0,
+                       0xffff880000001000, 'bash')
+        self.table.add(201, 200, 0xffff880000003000, -1, 2,
+                       0xffff880000001000, 'bash')
+        self.table.add(300, 300, 0xffff880000005000, 3, 1,
+                       0xffff880000002000, 'migration/3')
+
+    def test_columns(self):
+        row = self.table.row(201)
+        self.assertTrue(self.table.tgid[row] == 200)
+        self.assertTrue(self.table.address[row] == 0xffff880000003000)
+        self.assertTrue(self.table.cpu[row] == -1)
+        self.assertTrue(self.table.rss[row] == -1)
+
+    def test_update(self):
+        self.table.add(200, 200, 0xffff880000004000, 1, 0)
+        self.assertTrue(len(self.table) == 4)
+        row = self.table.row(200)
+        self.assertTrue(self.table.address[row] == 0xffff880000004000)
+
+    def test_mem_usage(self):
+        self.table.set_mem_usage(200, 12, 345)
+        row = self.table.row(200)
+        self.assertTrue(self.table.rss[row] == 12)
+        self.assertTrue(self.table.total_vm[row] == 345)
+
+    def test_remove(self):
+        self.table.remove(1)
+        self.assertFalse(1 in self.table)
+        self.assertTrue(self.table.pids() == [200, 201, 300])
+        with self.assertRaises(KeyError):
+            self.table.row(1)
+
+    def test_address_index(self):
+        self.assertTrue(self.table.pid_for_address(0xffff880000003000) == 201)
+        with self.assertRaises(KeyError):
+            self.table.pid_for_address(0xffff880000009000)
+
+    def test_thread_group(self):
+        self.assertTrue(self.table.thread_group(200) == [200, 201])
+        self.assertTrue(self.table.thread_group(42) == [])
+
+    def test_parents(self):
+        self.assertTrue(self.table.children(1) == [200, 201])
+        self.assertTrue(self.table.children(200) == [300])
+        self.assertTrue(self.table.parent_pid(300) == 200)
+        self.assertTrue(self.table.parent_pid(1) is None)
+
+    def test_names(self):
+        self.assertTrue(len(self.table.names) == 3)
+        self.assertTrue(self.table.pids_for_comm('bash') == [200, 201])
+        self.assertTrue(self.table.pids_matching_comm('^mig') == [300])
+        self.assertTrue(self.table.comm_for_pid(1) == 'systemd')
+
+    def test_state_and_cpu(self):
+        self.assertTrue(self.table.pids_in_state(1) == [1, 300])
+        self.assertTrue(self.table.pids_in_state(0) == [200])
+        self.assertTrue(self.table.pids_on_cpu(3) == [200, 300])
+
+    def test_index_rebuilt(self):
+        self.assertTrue(self.table.pids_for_comm('bash') == [200, 201])
+        self.table.add(202, 200, 0xffff880000006000, 0, 0,
+                       0xffff880000001000, 'bash')
+        self.assertTrue(self.table.pids_for_comm('bash') == [200, 201, 202])
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# vim:set shiftwidth=4 softtabstop=4 expandtab textwidth=79:
+
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+
+import unittest
+import struct
+
+from crash.arch.x86_64 import x86_64Architecture
+
+STACK = 0xffffc90000010000
+ENTRY = 0xffffffff81800000
+KERNEL_PC = 0xffffffff81234567
+USER_PC = 0x00007f0012345678
+
+class FakeUnwindInfo(object):
+    def __init__(self, frame_id):
+        self.frame_id = frame_id
+        self.saved = {}
+
+    def add_saved_register(self, name, value):
+        self.saved[name] = value
+
+class FakePendingFrame(object):
+    def __init__(self, **registers):
+        self.registers = registers
+
+    def read_register(self, name):
+        return self.registers[name]
+
+    def create_unwind_info(self, frame_id):
+        return FakeUnwindInfo(frame_id)
+
+class TestUnwindFrame(unittest.TestCase):
+    def setUp(self):
+        # Only the state unwind_frame uses, without a kernel to read
+        arch = x86_64Architecture.__new__(x86_64Architecture)
+        arch.ulong = struct.Struct('<Q')
+        arch.user_limit = 0xffff000000000000
+        arch.entry_text = (ENTRY, ENTRY + 0x1000)
+        arch.frame_pointers = True
+        arch.pt_regs_size = 168
+        arch.memory = {}
+        arch.task_stack_range = lambda: (STACK, STACK + 0x4000)
+        arch.read_ulong = lambda address: arch.memory[address]
+        arch.read_pt_regs = lambda address: None
+        arch.read_irq_pt_regs = lambda sp: None
+        self.arch = arch
+
+    def frame(self, pc, sp, rbp=0):
+        return FakePendingFrame(rip=pc, rsp=sp, rbp=rbp)
+
+    def test_caller_returning_to_user_ends_backtrace(self):
+        rbp = STACK + 0x3f00
+        for ret in [ USER_PC, 0 ]:
+            self.arch.memory[rbp + 8] = ret
+            info = self.arch.unwind_frame(self.frame(KERNEL_PC,
+                                                     STACK + 0x3e00, rbp))
+            self.assertTrue(info is not None)
+            self.assertFalse('rip' in info.saved)
+
+    def test_kernel_caller_is_left_to_gdb(self):
+        rbp = STACK + 0x3f00
+        self.arch.memory[rbp + 8] = KERNEL_PC
+        self.assertTrue(self.arch.unwind_frame(
+                self.frame(KERNEL_PC, STACK + 0x3e00, rbp)) is None)
+
+    def test_untrusted_frame_pointer_is_ignored(self):
+        # Outside the stack, or below the stack pointer
+        for rbp in [ 0, STACK - 0x100, STACK + 0x3d00 ]:
+            self.assertTrue(self.arch.unwind_frame(
+                    self.frame(KERNEL_PC, STACK + 0x3e00, rbp)) is None)
+
+        self.arch.frame_pointers = False
+        rbp = STACK + 0x3f00
+        self.arch.memory[rbp + 8] = USER_PC
+        self.assertTrue(self.arch.unwind_frame(
+                self.frame(KERNEL_PC, STACK + 0x3e00, rbp)) is None)
+
+    def test_entry_from_user_ends_backtrace(self):
+        for regs in [ None, { 'cs' : 0x33, 'rip' : USER_PC },
+                      { 'cs' : 0x10, 'rip' : 0 } ]:
+            self.arch.read_pt_regs = lambda address: regs
+            info = self.arch.unwind_frame(self.frame(ENTRY + 0x10,
+                                                     STACK + 0x3f58))
+            self.assertTrue(info is not None)
+            self.assertFalse('rip' in info.saved)
+
+    def test_user_pc_has_no_caller(self):
+        info = self.arch.unwind_frame(self.frame(USER_PC, 0x7ffc0000))
+        self.assertTrue(info is not None)
+        self.assertFalse('rip' in info.saved)